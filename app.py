@@ -1,16 +1,41 @@
 import os
-from flask import Flask, render_template, redirect, flash, request, jsonify, url_for, abort
+import sys
+import json
+import click
+import mimetypes
+import tempfile
+from flask import Flask, Response, render_template, redirect, flash, request, jsonify, url_for, abort, make_response, send_file
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from flask_migrate import Migrate
 from datetime import datetime
 from dotenv import load_dotenv
-from models import db, User, Site
-from slugify import slugify
-from github_routes import github_bp
-from slack_routes import slack_bp
+from jinja2 import FileSystemBytecodeCache
 
+# Load .env before the project modules below read their settings.
 load_dotenv()
 
+from models import db, User, Site, SiteFile, SiteRevision
+from db_health import DatabaseHealthMonitor
+from site_cache import site_cache, SITE_CACHE_MAX_AGE
+from publisher import publisher, PUBLISH_IMMUTABLE_MAX_AGE
+from static_assets import static_assets
+from page_cache import page_cache
+from metrics import metrics, TimedQueuePool
+from query_profiler import query_profiler
+from tracing import tracer
+from python_runner import runner, RunnerBusy, OutputRing
+from run_cache import result_cache, code_key, cacheable
+from slugify import slugify
+from sqlalchemy import update
+from content_patch import apply_patch, PatchError
+from save_buffer import save_buffer
+from content_store import content_store, content_hash
+from site_files import (INDEX_FILE, FileError, file_entry, load_files,
+                        stage_files)
+from github_jobs import github_jobs
+from lazy_views import add_lazy_routes, LazyGroup
+from import_time import measure_imports
+from github_reconciler import github_reconciler
+
 
 def get_database_url():
     """Get database URL from environment variables"""
@@ -24,43 +49,74 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     'pool_size': 10,
     'pool_recycle': 3600,
-    'pool_pre_ping': True
+    'pool_pre_ping': True,
+    'poolclass': TimedQueuePool
 }
 
 app.config['PREFERRED_URL_SCHEME'] = 'https'
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', 'false').lower() == 'true'
+
+# Compiled templates are shared between workers and survive restarts.
+JINJA_CACHE_DIR = os.getenv('JINJA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'spaces-jinja'))
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
 
 db.init_app(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-app.register_blueprint(github_bp)
-app.register_blueprint(slack_bp)
-
-
-def check_db_connection():
-    try:
-        with app.app_context():
-            db.engine.connect()
-        return True
-    except Exception as e:
-        app.logger.error(f"Database connection failed: {str(e)}")
-        return False
+# GitHub and Slack views pull in PyGithub and requests, so they are only
+# imported when one of their routes is first hit.
+GITHUB_ROUTES = [
+    ('/api/github/status', 'github_status', ['GET']),
+    ('/api/github/login', 'github_login', ['GET']),
+    ('/api/github/callback', 'github_callback', ['GET']),
+    ('/api/github/create-repo', 'create_repo', ['POST']),
+    ('/api/github/repo-info', 'repo_info', ['GET']),
+    ('/api/github/push', 'push_changes', ['POST']),
+    ('/api/github/jobs/<string:job_id>', 'job_info', ['GET']),
+    ('/api/github/disconnect-repo', 'disconnect_repo', ['POST']),
+]
+SLACK_ROUTES = [
+    ('/api/slack/login', 'slack_login', ['GET']),
+    ('/api/slack/callback', 'slack_callback', ['GET']),
+]
+add_lazy_routes(app, 'github_routes', GITHUB_ROUTES)
+add_lazy_routes(app, 'slack_routes', SLACK_ROUTES)
+
+metrics.init_app(app)
+query_profiler.init_app(app)
+tracer.init_app(app)
+db_health = DatabaseHealthMonitor(db)
+db_health.init_app(app)
+github_jobs.init_app(app)
+github_reconciler.init_app(app)
+save_buffer.init_app(app)
+static_assets.init_app(app)
+page_cache.init_app(app)
+
+
+def load_migrate():
+    """Set up Flask-Migrate, which replaces the lazy ``db`` group"""
+    from flask_migrate import Migrate
+    Migrate(app, db)
+    return app.cli.commands['db']
+
+
+# Flask-Migrate pulls in Alembic, which only the ``flask db`` commands need.
+app.cli.add_command(
+    LazyGroup('db', load_migrate, help='Perform database migrations.'))
 
 
 @app.before_request
 def check_database():
-    if request.endpoint in ['static', 'error_page']:
+    if request.endpoint in [
+            'static', 'static_asset', 'error_page', 'health', 'health_check',
+            'metrics'
+    ]:
         return None
-    try:
-        if not check_db_connection():
-            return render_template(
-                'error.html',
-                error_message=
-                "Database connection is currently unavailable. We're working on it!"
-            ), 503
-    except Exception as e:
-        app.logger.error(f"Database check failed: {str(e)}")
+    if not db_health.available:
         return render_template(
             'error.html',
             error_message=
@@ -68,7 +124,36 @@ def check_database():
         ), 503
 
 
+def loaded_stats(module, name):
+    """Stats of a lazily imported module's singleton, or None if not loaded"""
+    module = sys.modules.get(module)
+    return getattr(module, name).stats() if module else None
+
+
+@app.route('/api/health')
+def health():
+    """Report the cached database health state"""
+    snapshot = db_health.snapshot()
+    status = 503 if snapshot['breaker_open'] else 200
+    return jsonify({
+        'database': snapshot,
+        'site_cache': site_cache.stats(),
+        'python_runner': runner.stats(),
+        'run_cache': result_cache.stats(),
+        'github_jobs': github_jobs.stats(),
+        'github_cache': loaded_stats('github_client', 'github_cache'),
+        'github_reconciler': github_reconciler.stats(),
+        'http': loaded_stats('http_client', 'http'),
+        'save_buffer': save_buffer.stats(),
+        'publisher': publisher.stats(),
+        'page_cache': page_cache.stats(),
+        'query_profiler': query_profiler.stats(),
+        'tracing': tracer.stats()
+    }), status
+
+
 @app.route('/error')
+@page_cache.cached
 def error_page():
     return render_template(
         'error.html',
@@ -87,6 +172,7 @@ def load_user(user_id):
 
 
 @app.route('/')
+@page_cache.cached
 def index():
     return render_template('index.html')
 
@@ -154,23 +240,68 @@ def signup():
 @login_required
 def welcome():
     """Welcome page after successful login"""
-    sites = Site.query.filter_by(user_id=current_user.id).order_by(
-        Site.updated_at.desc()).all()
+    sites = save_buffer.overlay_rows(Site.listing(current_user.id).all())
     return render_template('welcome.html', sites=sites)
 
 
+@app.route('/api/sites')
+@login_required
+def list_sites():
+    """List the current user's sites without their content.
+
+    Newest first; pass the returned ``next_cursor`` as ``cursor`` to get
+    the next page.
+    """
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    query = Site.listing(current_user.id)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            updated_at, _, last_id = cursor.rpartition('_')
+            updated_at = datetime.fromisoformat(updated_at)
+            last_id = int(last_id)
+        except ValueError:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        query = query.filter(
+            db.or_(Site.updated_at < updated_at,
+                   db.and_(Site.updated_at == updated_at, Site.id < last_id)))
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f'{rows[-1].updated_at.isoformat()}_{rows[-1].id}'
+    # After the cursor: pages follow the stored timestamps until a flush.
+    rows = save_buffer.overlay_rows(rows)
+    return jsonify({
+        'sites': [{
+            'id': row.id,
+            'name': row.name,
+            'slug': row.slug,
+            'site_type': row.site_type,
+            'is_public': row.is_public,
+            'version': row.version,
+            'created_at': row.created_at.isoformat(),
+            'updated_at': row.updated_at.isoformat()
+        } for row in rows],
+        'next_cursor': next_cursor
+    })
+
+
 @app.route('/edit/<int:site_id>')
 @login_required
 def edit_site(site_id):
     """Edit a site"""
     try:
-        site = Site.query.get_or_404(site_id)
+        site = Site.with_content().get_or_404(site_id)
         if site.user_id != current_user.id:
             app.logger.warning(
                 f'User {current_user.id} attempted to access site {site_id} owned by {site.user_id}'
             )
             abort(403)
         app.logger.info(f'User {current_user.id} editing site {site_id}')
+        save_buffer.overlay(site)
         if site.site_type == 'python':
             return render_template('python_editor.html', site=site)
         return render_template('site_editor.html', site=site)
@@ -184,40 +315,235 @@ def edit_site(site_id):
 def run_python(site_id):
     """Run Python code"""
     try:
-        site = Site.query.get_or_404(site_id)
+        site = Site.ownership(site_id).first_or_404()
         if site.user_id != current_user.id:
             abort(403)
 
         data = request.get_json()
         code = data.get('code', '')
+        deterministic = bool(data.get('deterministic'))
+
+        key = code_key(code) if deterministic else None
+        result = result_cache.get(key) if deterministic else None
+        cached = result is not None
+        if result is None:
+            try:
+                with tracer.span('python.run') as span:
+                    result = runner.run(code)
+                    span.set('python.ok', result['ok'])
+                metrics.observe_run(result)
+            except RunnerBusy:
+                return jsonify({
+                    'message':
+                    'The code runner is busy right now, please try again'
+                }), 503
+            if deterministic and cacheable(result):
+                result_cache.put(key, result)
+
+        if not result['ok']:
+            return jsonify({
+                'output': result['stdout'] + result['error'],
+                'stderr': result['stderr'],
+                'error': True,
+                'cached': cached
+            }), 400
+        return jsonify({
+            'output': result['stdout'],
+            'stderr': result['stderr'],
+            'cached': cached
+        })
+
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
 
-        import sys
-        from io import StringIO
-        old_stdout = sys.stdout
-        redirected_output = StringIO()
-        sys.stdout = redirected_output
 
+def _ndjson(**event):
+    return json.dumps(event) + '\n'
+
+
+def _exit_event(status, cached):
+    return _ndjson(type='exit',
+                   ok=status['ok'],
+                   error=status.get('error'),
+                   timed_out=status.get('timed_out', False),
+                   truncated=status.get('truncated', False),
+                   duration=status.get('duration'),
+                   cached=cached)
+
+
+def _replay_events(result):
+    """Stream a cached result in the same shape as a live run"""
+    for stream in ('stdout', 'stderr'):
+        if result[stream]:
+            yield _ndjson(type=stream, data=result[stream])
+    yield _exit_event(result, cached=True)
+
+
+@app.route('/api/sites/<int:site_id>/run/stream', methods=['POST'])
+@login_required
+def run_python_stream(site_id):
+    """Run Python code and stream its output as NDJSON"""
+    site = Site.ownership(site_id).first_or_404()
+    if site.user_id != current_user.id:
+        abort(403)
+
+    data = request.get_json() or {}
+    code = data.get('code', '')
+    deterministic = bool(data.get('deterministic'))
+
+    key = code_key(code) if deterministic else None
+    cached = result_cache.get(key) if deterministic else None
+    if cached is not None:
+        return Response(_replay_events(cached),
+                        mimetype='application/x-ndjson')
+
+    try:
+        job = runner.submit(code)
+    except RunnerBusy:
+        return jsonify({
+            'message':
+            'The code runner is busy right now, please try again'
+        }), 503
+
+    # The generator runs after the request span ends, so it is not current.
+    run_span = tracer.start_span('python.run', tracer.current(), streamed=True)
+
+    def generate():
+        ring = OutputRing()
+        collected = {'stdout': [], 'stderr': []}
+        collected_size = 0
+        collect = deterministic
         try:
-            exec(code, {})
-            output = redirected_output.getvalue()
-            return jsonify({'output': output})
-        except Exception as e:
-            return jsonify({'output': str(e), 'error': True}), 400
+            for stream, payload in job:
+                if stream != 'exit':
+                    if collect:
+                        collected[stream].append(payload)
+                        collected_size += len(payload)
+                        collect = collected_size <= result_cache.max_entry
+                    if ring.accept(stream, payload):
+                        yield _ndjson(type=stream, data=payload)
+                    continue
+                if ring.dropped:
+                    yield _ndjson(type='truncated', dropped=ring.dropped)
+                for tail_stream, text in ring.drain():
+                    yield _ndjson(type=tail_stream, data=text)
+                metrics.observe_run(payload)
+                run_span.set('python.ok', payload['ok'])
+                yield _exit_event(payload, cached=False)
+                if collect and cacheable(payload):
+                    result_cache.put(
+                        key,
+                        dict(payload,
+                             stdout=''.join(collected['stdout']),
+                             stderr=''.join(collected['stderr'])))
         finally:
-            sys.stdout = old_stdout
+            job.close()
+            tracer.end(run_span)
 
-    except Exception as e:
-        return jsonify({'message': str(e)}), 500
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
-@app.route('/s/<string:slug>')
+def send_published(slug, name):
+    """Serve a file from the site's deployed snapshot, if it has one"""
+    found = publisher.lookup(slug, name)
+    if found is None:
+        return None
+    path, entry = found
+    encoding = request.accept_encodings.best_match(entry['encodings'])
+    immutable = entry['immutable']
+    try:
+        response = send_file(
+            f'{path}.{encoding}' if encoding else path,
+            mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            etag=f"{entry['etag']}-{encoding}" if encoding else entry['etag'],
+            max_age=PUBLISH_IMMUTABLE_MAX_AGE if immutable else SITE_CACHE_MAX_AGE,
+            conditional=True)
+    except FileNotFoundError:
+        return None  # snapshot swapped out meanwhile
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = immutable
+    return response
+
+
+# Only the slashed form: relative asset URLs resolve under /s/<slug>/, and
+# Flask redirects /s/<slug> there with a 308.
+@app.route('/s/<string:slug>/')
 def view_site(slug):
     """View a public site"""
-    site = Site.query.filter_by(slug=slug).first_or_404()
-    if not site.is_public and (not current_user.is_authenticated
-                               or site.user_id != current_user.id):
-        abort(403)
-    return site.html_content
+    response = send_published(slug, INDEX_FILE)
+    if response is not None:
+        return response
+
+    # Cheap check against the database, as other processes don't see this
+    # one's invalidations.
+    current = db.session.query(Site.id, Site.version, Site.is_public).filter_by(
+        slug=slug).first()
+    entry = None
+    if current is not None and current.is_public:
+        entry = site_cache.get(slug, current.id,
+                               save_buffer.version(current.id, current.version))
+    if entry is None:
+        site = save_buffer.overlay(
+            Site.with_content().filter_by(slug=slug).first_or_404())
+        if not site.is_public:
+            if (not current_user.is_authenticated
+                    or site.user_id != current_user.id):
+                abort(403)
+            response = make_response(site.html_content)
+            response.cache_control.private = True
+            response.cache_control.no_store = True
+            return response
+        entry = site_cache.put(site)
+
+    encoding = request.accept_encodings.best_match(entry.encodings)
+    if encoding:
+        response = make_response(entry.encodings[encoding])
+        response.content_encoding = encoding
+        response.set_etag(entry.encoding_etag(encoding))
+    else:
+        response = make_response(entry.body)
+        response.set_etag(entry.etag)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = SITE_CACHE_MAX_AGE
+    return response.make_conditional(request)
+
+
+@app.route('/s/<string:slug>/<path:name>')
+def view_site_file(slug, name):
+    """Serve one asset of a site"""
+    if name == INDEX_FILE:
+        return view_site(slug)
+    response = send_published(slug, name)
+    if response is not None:
+        return response
+
+    row = (db.session.query(SiteFile.content, SiteFile.content_hash,
+                            Site.is_public, Site.user_id)
+           .join(Site, SiteFile.site_id == Site.id)
+           .filter(Site.slug == slug, SiteFile.name == name).first())
+    if row is None:
+        abort(404)
+
+    response = make_response(row.content)
+    response.mimetype = (mimetypes.guess_type(name)[0]
+                         or 'application/octet-stream')
+    response.set_etag(row.content_hash[:32])
+    if row.is_public:
+        response.cache_control.public = True
+        response.cache_control.max_age = SITE_CACHE_MAX_AGE
+    else:
+        if (not current_user.is_authenticated
+                or row.user_id != current_user.id):
+            abort(403)
+        response.cache_control.private = True
+        response.cache_control.no_store = True
+    return response.make_conditional(request)
 
 
 @app.route('/api/sites', methods=['POST'])
@@ -248,7 +574,11 @@ def create_site():
             f'Creating new site "{name}" for user {current_user.id}')
         site = Site(name=name, user_id=current_user.id)
         db.session.add(site)
+        db.session.flush()
+        content_store.record_revision(site.id, site.version,
+                                      site.html_content, site.python_content)
         db.session.commit()
+        site_cache.put(site)
 
         app.logger.info(f'Successfully created site {site.id}')
         return jsonify({
@@ -265,38 +595,236 @@ def create_site():
 @app.route('/api/sites/<int:site_id>/python', methods=['PUT'])
 @login_required
 def update_site(site_id):
-    """Update a site's content"""
-    site = Site.query.get_or_404(site_id)
+    """Update a site's content.
+
+    Clients send ``base_version`` with either full content or a patch
+    (``html_patch``/``python_patch``, see ``content_patch.apply_patch``)
+    against that version. The write only succeeds if the site is still at
+    ``base_version``; otherwise the current version is returned with a 409.
+    Saves go through the write-behind ``save_buffer`` when it is enabled.
+    """
+    site = Site.with_content().get_or_404(site_id)
     if site.user_id != current_user.id:
         abort(403)
+    save_buffer.overlay(site)
 
     data = request.get_json()
+    base_version = data.get('base_version')
     html_content = data.get('html_content')
     python_content = data.get('python_content')
+    html_patch = data.get('html_patch')
+    python_patch = data.get('python_patch')
 
-    if html_content is None and python_content is None:
+    if all(value is None for value in
+           (html_content, python_content, html_patch, python_patch)):
         return jsonify({'message': 'Content is required'}), 400
+    if (html_patch is not None or python_patch is not None) and base_version is None:
+        return jsonify({'message': 'base_version is required with a patch'}), 400
+    if base_version is not None and base_version != site.version:
+        return jsonify({'message': 'Site was changed elsewhere',
+                        'version': site.version}), 409
+
+    try:
+        if html_patch is not None:
+            html_content = apply_patch(site.html_content or '', html_patch)
+        if python_patch is not None:
+            python_content = apply_patch(site.python_content or '', python_patch)
+    except PatchError as e:
+        return jsonify({'message': str(e)}), 400
 
-    if html_content is not None:
-        site.html_content = html_content
-    if python_content is not None:
-        site.python_content = python_content
+    try:
+        version = save_site_content(site, base_version, html_content,
+                                    python_content)
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f'Error saving site: {str(e)}')
+        return jsonify({'message': 'Failed to update site'}), 500
+    if version is None:
+        return jsonify({'message': 'Site was changed elsewhere',
+                        'version': site.version}), 409
+    return jsonify({'message': 'Site updated successfully',
+                    'version': version})
+
+
+def save_site_content(site, base_version, html_content=None,
+                      python_content=None):
+    """Write new content for an overlaid ``site`` and record a revision.
+
+    Returns the new version, or None if the site is no longer at
+    ``base_version``.
+    """
+    if save_buffer.enabled:
+        version = save_buffer.stage(site, base_version, html_content,
+                                    python_content)
+        if version is not None:
+            site_cache.put(site)
+        return version
+
+    if html_content is None:
+        html_content = site.html_content
+    if python_content is None:
+        python_content = site.python_content
+
+    condition = Site.id == site.id
+    if base_version is not None:
+        condition &= Site.version == base_version
+    version = db.session.execute(
+        update(Site).where(condition).values(
+            html_content=html_content,
+            python_content=python_content,
+            updated_at=datetime.utcnow(),
+            version=Site.version + 1).returning(Site.version)).scalar()
+    if version is None:
+        db.session.rollback()
+        return None
+    content_store.record_revision(site.id, version, html_content,
+                                  python_content)
+    db.session.commit()
+    db.session.refresh(site)
+    site_cache.put(site)
+    return version
 
-    site.updated_at = datetime.utcnow()
+
+@app.route('/api/sites/<int:site_id>/files')
+@login_required
+def get_site_files(site_id):
+    """Return every file of a site in one response"""
+    site = Site.with_content().get_or_404(site_id)
+    if site.user_id != current_user.id:
+        abort(403)
+    save_buffer.overlay(site)
+    return jsonify({'version': site.version, 'files': load_files(site)})
+
+
+@app.route('/api/sites/<int:site_id>/files/<path:name>')
+@login_required
+def get_site_file(site_id, name):
+    """Return a single file of a site"""
+    site = Site.with_content().get_or_404(site_id)
+    if site.user_id != current_user.id:
+        abort(403)
+    if name == INDEX_FILE:
+        content = save_buffer.overlay(site).html_content
+    else:
+        content = SiteFile.query.options(db.undefer(SiteFile.content)).filter_by(
+            site_id=site_id, name=name).first_or_404().content
+    return jsonify(file_entry(name, content))
+
+
+@app.route('/api/sites/<int:site_id>/files', methods=['PUT'])
+@login_required
+def save_site_files(site_id):
+    """Write several files of a site in one transaction.
+
+    ``files`` maps names to content (null deletes a file). Names present in
+    ``base_hashes`` are only written if their current hash still matches;
+    otherwise nothing is written and the conflicting names come back with
+    a 409. Every save moves the site to a new version, claimed with the
+    same conditional UPDATE as ``update_site`` before the hashes are
+    compared, so concurrent saves of one site cannot both pass the check.
+    Saves here write straight through the save buffer.
+    """
+    site = Site.with_content().get_or_404(site_id)
+    if site.user_id != current_user.id:
+        abort(403)
+
+    data = request.get_json() or {}
+    changes = data.get('files')
+    if not isinstance(changes, dict) or not changes:
+        return jsonify({'message': 'Files are required'}), 400
+
+    if save_buffer.enabled:
+        save_buffer.flush(user_id=current_user.id)
+        db.session.refresh(site)
+
+    version = db.session.execute(
+        update(Site).where(Site.id == site.id,
+                           Site.version == site.version).values(
+                               updated_at=datetime.utcnow(),
+                               version=Site.version + 1).returning(
+                                   Site.version)).scalar()
+    if version is None:
+        db.session.rollback()
+        return jsonify({'message': 'Site was changed elsewhere',
+                        'version': db.session.get(Site, site_id).version}), 409
 
     try:
+        conflicts, html_content = stage_files(site, changes,
+                                              data.get('base_hashes'))
+    except FileError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    if conflicts:
+        db.session.rollback()
+        return jsonify({'message': 'Files were changed elsewhere',
+                        'conflicts': conflicts}), 409
+
+    try:
+        if html_content is not None:
+            db.session.execute(
+                update(Site).where(Site.id == site.id).values(
+                    html_content=html_content))
+        content_store.record_revision(
+            site.id, version, html_content
+            if html_content is not None else site.html_content,
+            site.python_content)
         db.session.commit()
-        return jsonify({'message': 'Site updated successfully'})
     except Exception as e:
         db.session.rollback()
-        return jsonify({'message': 'Failed to update site'}), 500
+        app.logger.error(f'Error saving site files: {str(e)}')
+        return jsonify({'message': 'Failed to save files'}), 500
+    db.session.refresh(site)
+    site_cache.put(site)
+    return jsonify({
+        'message': 'Files saved successfully',
+        'version': version,
+        'hashes': {
+            name: content_hash(content) if content is not None else None
+            for name, content in changes.items()
+        }
+    })
+
+
+@app.route('/api/sites/<int:site_id>/deploy', methods=['POST'])
+@login_required
+def deploy_site(site_id):
+    """Publish the site's current files as a static snapshot"""
+    site = Site.with_content().get_or_404(site_id)
+    if site.user_id != current_user.id:
+        abort(403)
+    save_buffer.overlay(site)
+    if not site.is_public:
+        return jsonify({'message': 'Only public sites can be deployed'}), 400
+
+    files = {entry['name']: entry['content'] for entry in load_files(site)}
+    try:
+        snapshot = publisher.publish(site.slug, files)
+    except OSError as e:
+        app.logger.error(f'Error deploying site {site_id}: {str(e)}')
+        return jsonify({'message': 'Failed to deploy site'}), 500
+    return jsonify({
+        'message': 'Site deployed successfully',
+        'url': url_for('view_site', slug=site.slug, _external=True),
+        'snapshot': snapshot
+    })
+
+
+@app.route('/api/sites/<int:site_id>/deploy', methods=['DELETE'])
+@login_required
+def undeploy_site(site_id):
+    """Stop serving the deployed snapshot and go back to live content"""
+    site = Site.query.get_or_404(site_id)
+    if site.user_id != current_user.id:
+        abort(403)
+    publisher.unpublish(site.slug)
+    return jsonify({'message': 'Site deployment removed'})
 
 
 @app.route('/api/sites/<int:site_id>/rename', methods=['PUT'])
 @login_required
 def rename_site(site_id):
     """Rename a site"""
-    site = Site.query.get_or_404(site_id)
+    site = Site.with_content().get_or_404(site_id)
     if site.user_id != current_user.id:
         abort(403)
 
@@ -314,10 +842,14 @@ def rename_site(site_id):
             return jsonify({'message':
                             'A site with this name already exists'}), 400
 
+        old_slug = site.slug
         site.name = new_name
         site.slug = new_slug
         site.updated_at = datetime.utcnow()
         db.session.commit()
+        site_cache.invalidate(old_slug)
+        site_cache.put(save_buffer.overlay(site))
+        publisher.rename(old_slug, new_slug)
         return jsonify({'message': 'Site renamed successfully'})
     except Exception as e:
         db.session.rollback()
@@ -325,6 +857,79 @@ def rename_site(site_id):
         return jsonify({'message': 'Failed to rename site'}), 500
 
 
+@app.route('/api/sites/<int:site_id>/revisions')
+@login_required
+def list_revisions(site_id):
+    """List a site's saved revisions, newest first"""
+    site = Site.query.get_or_404(site_id)
+    if site.user_id != current_user.id:
+        abort(403)
+
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    query = SiteRevision.query.filter_by(site_id=site_id)
+    before = request.args.get('before', type=int)
+    if before is not None:
+        query = query.filter(SiteRevision.version < before)
+    revisions = query.order_by(SiteRevision.version.desc()).limit(limit).all()
+    return jsonify({
+        'current_version': save_buffer.overlay(site).version,
+        'revisions': [{
+            'version': revision.version,
+            'html_hash': revision.html_hash,
+            'python_hash': revision.python_hash,
+            'created_at': revision.created_at.isoformat()
+        } for revision in revisions]
+    })
+
+
+@app.route('/api/sites/<int:site_id>/revisions/<int:version>')
+@login_required
+def get_revision(site_id, version):
+    """Return the content of one revision"""
+    site = Site.ownership(site_id).first_or_404()
+    if site.user_id != current_user.id:
+        abort(403)
+
+    revision = SiteRevision.query.filter_by(site_id=site_id,
+                                            version=version).first_or_404()
+    html_content, python_content = content_store.revision_content(revision)
+    return jsonify({
+        'version': revision.version,
+        'html_content': html_content,
+        'python_content': python_content,
+        'created_at': revision.created_at.isoformat()
+    })
+
+
+@app.route('/api/sites/<int:site_id>/revisions/<int:version>/restore',
+           methods=['POST'])
+@login_required
+def restore_revision(site_id, version):
+    """Make an old revision's content the site's new current version"""
+    site = Site.with_content().get_or_404(site_id)
+    if site.user_id != current_user.id:
+        abort(403)
+    save_buffer.overlay(site)
+
+    revision = SiteRevision.query.filter_by(site_id=site_id,
+                                            version=version).first_or_404()
+    html_content, python_content = content_store.revision_content(revision)
+    base_version = (request.get_json(silent=True) or {}).get('base_version')
+
+    try:
+        new_version = save_site_content(site, base_version, html_content,
+                                        python_content)
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f'Error restoring revision: {str(e)}')
+        return jsonify({'message': 'Failed to restore revision'}), 500
+    if new_version is None:
+        return jsonify({'message': 'Site was changed elsewhere',
+                        'version': site.version}), 409
+    return jsonify({'message': f'Restored revision {version}',
+                    'version': new_version})
+
+
 @app.route('/api/sites/python', methods=['POST'])
 @login_required
 def create_python_site():
@@ -350,7 +955,11 @@ def create_python_site():
                     html_content='print("Hello, World!")',
                     site_type='python')
         db.session.add(site)
+        db.session.flush()
+        content_store.record_revision(site.id, site.version,
+                                      site.html_content, site.python_content)
         db.session.commit()
+        site_cache.put(site)
 
         return jsonify({
             'message': 'Python script created successfully',
@@ -365,9 +974,10 @@ def create_python_site():
 @login_required
 def python_editor(site_id):
     """Python script editor"""
-    site = Site.query.get_or_404(site_id)
+    site = Site.with_content().get_or_404(site_id)
     if site.user_id != current_user.id:
         abort(403)
+    save_buffer.overlay(site)
     return render_template('python_editor.html', site=site)
 
 
@@ -380,8 +990,14 @@ def delete_site(site_id):
         abort(403)
 
     try:
+        slug = site.slug
+        SiteRevision.query.filter_by(site_id=site.id).delete()
+        SiteFile.query.filter_by(site_id=site.id).delete()
         db.session.delete(site)
         db.session.commit()
+        save_buffer.discard(site.id)
+        site_cache.invalidate(slug)
+        publisher.unpublish(slug)
         return jsonify({'message': 'Site deleted successfully'})
     except Exception as e:
         db.session.rollback()
@@ -389,6 +1005,7 @@ def delete_site(site_id):
 
 
 @app.route('/documentation')
+@page_cache.cached
 def documentation():
     """Documentation page"""
     return render_template('documentation.html')
@@ -398,6 +1015,10 @@ def documentation():
 @login_required
 def logout():
     """Logout the current user"""
+    try:
+        save_buffer.flush(user_id=current_user.id)
+    except Exception as e:
+        app.logger.error(f'Error flushing saves on logout: {str(e)}')
     logout_user()
     flash('You have been logged out.', 'success')
     return redirect(url_for('index'))
@@ -456,6 +1077,28 @@ def settings():
     return render_template('settings.html')
 
 
+@app.cli.command('import-time')
+@click.option('--runs', default=3, help='Fresh interpreters to measure.')
+@click.option('--limit', default=15, help='Modules to list.')
+@click.option('--budget-ms', type=float, default=None,
+              help='Exit with an error if importing the app takes longer.')
+def import_time(runs, limit, budget_ms):
+    """Report what importing the app costs, per module"""
+    total, modules = measure_imports('app', runs)
+    for name, ms in modules[:limit]:
+        print(f'{ms:9.1f} ms  {name}')
+    print(f'{total:9.1f} ms  total')
+    if budget_ms is not None and total > budget_ms:
+        raise SystemExit(f'Import time {total:.1f} ms is over the {budget_ms:.1f} ms budget')
+
+
+@app.cli.command('reconcile-github')
+def reconcile_github():
+    """Verify linked GitHub repositories once and exit"""
+    outcomes = github_reconciler.run_once()
+    print(dict(outcomes))
+
+
 def initialize_database():
     try:
         with app.app_context():
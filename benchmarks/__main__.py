@@ -0,0 +1,173 @@
+"""Route-level benchmarks.
+
+    python -m benchmarks run --database sqlite --database postgres
+    python -m benchmarks compare before.json after.json
+
+``--database`` takes ``sqlite`` (a temporary file), ``postgres`` (a
+throwaway cluster started with initdb/pg_ctl) or a URL of an empty
+database. Each database is benchmarked in its own process.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from benchmarks import bench
+from benchmarks.compare import compare, load, report
+
+
+@contextmanager
+def database_url(spec):
+    if spec == 'sqlite':
+        directory = tempfile.mkdtemp(prefix='spaces-bench-')
+        path = os.path.join(directory, 'bench.db')
+        try:
+            yield f'sqlite:///{path}'
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rmdir(directory)
+    elif spec == 'postgres':
+        with bench.local_postgres() as url:
+            yield url
+    else:
+        yield spec
+
+
+def database_name(spec):
+    if spec in ('sqlite', 'postgres'):
+        return spec
+    return spec.split(':', 1)[0].split('+', 1)[0]
+
+
+def add_run_options(parser):
+    parser.add_argument('--scenario',
+                        action='append',
+                        choices=sorted(bench.SCENARIOS),
+                        help='Scenario to run (repeatable, default all)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests',
+                        type=int,
+                        default=50,
+                        help='Requests per concurrent client and scenario')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--sites-per-user', type=int, default=5)
+    parser.add_argument('--content-size',
+                        type=int,
+                        default=2048,
+                        help='Median site content size in bytes')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--github-latency-ms',
+                        type=float,
+                        default=0,
+                        help='Latency the fake GitHub adds to each call')
+    parser.add_argument('--warmup',
+                        type=int,
+                        default=5,
+                        help='Unmeasured requests before each scenario')
+
+
+def run_options(args):
+    options = []
+    for name in ('concurrency', 'requests', 'users', 'sites_per_user',
+                 'content_size', 'seed', 'github_latency_ms', 'warmup'):
+        options += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    for scenario in args.scenario or []:
+        options += ['--scenario', scenario]
+    return options
+
+
+def command_run(args):
+    if args.concurrency > args.users:
+        sys.exit('--concurrency cannot exceed --users')
+    results = {'environment': bench.environment(), 'databases': {}}
+    results['config'] = {
+        name: getattr(args, name)
+        for name in ('concurrency', 'requests', 'users', 'sites_per_user',
+                     'content_size', 'seed', 'github_latency_ms')
+    }
+    for spec in args.database or ['sqlite']:
+        name = database_name(spec)
+        print(f'{name}:', file=sys.stderr)
+        try:
+            with database_url(spec) as url, tempfile.NamedTemporaryFile(
+                    suffix='.json') as output:
+                subprocess.run([
+                    sys.executable, '-m', 'benchmarks', 'run-one',
+                    '--database-url', url, '--output', output.name
+                ] + run_options(args),
+                               check=True)
+                results['databases'][name] = load(output.name)
+        except (RuntimeError, subprocess.CalledProcessError) as e:
+            sys.exit(f'Benchmark against {name} failed: {e}')
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Wrote {args.output}', file=sys.stderr)
+
+
+def command_run_one(args):
+    result = bench.run(args.database_url,
+                       args.scenario or list(bench.SCENARIOS),
+                       args.concurrency,
+                       args.requests,
+                       args.users,
+                       args.sites_per_user,
+                       args.content_size,
+                       args.seed,
+                       github_latency=args.github_latency_ms / 1000,
+                       warmup=args.warmup)
+    with open(args.output, 'w') as f:
+        json.dump(result, f)
+    # Background threads (runner pool, save buffer) must not keep us alive.
+    os._exit(0)
+
+
+def command_compare(args):
+    rows = compare(load(args.base), load(args.new), args.threshold)
+    print(report(rows))
+    regressions = sum(1 for row in rows if row[-1])
+    if regressions:
+        print(f'{regressions} regression(s) beyond {args.threshold:.0%}')
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description=__doc__,
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Benchmark the hot routes')
+    run.add_argument('--database',
+                     action='append',
+                     help='sqlite, postgres or a database URL (repeatable)')
+    run.add_argument('--output', default='bench-results.json')
+    add_run_options(run)
+    run.set_defaults(func=command_run)
+
+    run_one = commands.add_parser('run-one')
+    run_one.add_argument('--database-url', required=True)
+    run_one.add_argument('--output', required=True)
+    add_run_options(run_one)
+    run_one.set_defaults(func=command_run_one)
+
+    compare_parser = commands.add_parser(
+        'compare', help='Flag regressions between two result files')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold',
+                                type=float,
+                                default=0.1,
+                                help='Allowed fractional slowdown')
+    compare_parser.set_defaults(func=command_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+import logging
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+import requests
+
+from benchmarks.fake_github import FakeGitHub
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def local_postgres():
+    """Throwaway PostgreSQL cluster in a temporary directory.
+
+    Needs ``initdb`` and ``pg_ctl`` on PATH. Yields the database URL.
+    """
+    if not shutil.which('initdb') or not shutil.which('pg_ctl'):
+        raise RuntimeError('initdb/pg_ctl not found; pass a postgresql:// '
+                           'URL to --database instead')
+    directory = tempfile.mkdtemp(prefix='spaces-bench-pg-')
+    data = os.path.join(directory, 'data')
+    port = free_port()
+    try:
+        subprocess.run(['initdb', '-D', data, '-A', 'trust', '-U', 'bench'],
+                       check=True,
+                       stdout=subprocess.DEVNULL)
+        subprocess.run([
+            'pg_ctl', '-D', data, '-w', '-l',
+            os.path.join(directory, 'postgres.log'), '-o',
+            f"-F -p {port} -k {directory} -c listen_addresses=''", 'start'
+        ],
+                       check=True,
+                       stdout=subprocess.DEVNULL)
+        try:
+            yield f'postgresql://bench@/postgres?host={directory}&port={port}'
+        finally:
+            subprocess.run(['pg_ctl', '-D', data, '-m', 'fast', 'stop'],
+                           stdout=subprocess.DEVNULL)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class Bench:
+    """The app served over real HTTP in this process, plus what it needs.
+
+    ``boot`` points the app at ``database_url`` and the fake GitHub server
+    (the environment must be set before ``app`` is imported, which is why
+    each database gets its own process) and counts the SQL statements each
+    request executes.
+    """
+
+    def __init__(self, database_url, github_latency=0.0):
+        self.database_url = database_url
+        self.github = FakeGitHub(latency=github_latency)
+        self.app = None
+        self.url = None
+        self.query_counts = []
+        self._server = None
+
+    def boot(self):
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self.github.start()
+        os.environ.update({
+            'DATABASE_URL': self.database_url,
+            'GITHUB_API_URL': self.github.url,
+            'GITHUB_OAUTH_URL': self.github.url,
+            'GITHUB_CLIENT_ID': 'bench',
+            'GITHUB_CLIENT_SECRET': 'bench',
+            'GITHUB_CALLBACK_URL': 'http://localhost/api/github/callback',
+        })
+        from flask import g, has_request_context
+        from sqlalchemy import event
+        from werkzeug.serving import make_server
+
+        from app import app
+        from models import db
+
+        self.app = app
+        with app.app_context():
+            db.create_all()
+
+            @event.listens_for(db.engine, 'before_cursor_execute')
+            def count_query(conn, cursor, statement, parameters, context,
+                            executemany):
+                if has_request_context():
+                    g.bench_queries = g.get('bench_queries', 0) + 1
+
+        @app.teardown_request
+        def record_queries(exc):
+            self.query_counts.append(g.get('bench_queries', 0))
+
+        self._server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.url = f'http://127.0.0.1:{self._server.server_port}'
+        threading.Thread(target=self._server.serve_forever,
+                         name='bench-server',
+                         daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+        self.github.stop()
+
+    def seed(self, users, sites_per_user, content_size, seed):
+        """Load the synthetic dataset for ``seed`` and a GitHub repo for the
+        first site of every user who has one.
+
+        Returns ``[(email, own site id), ...]`` and the public slugs.
+        """
+        from sqlalchemy import func, insert, select
+
+        from models import db, GitHubRepo, Site, User
+        from setup_db import load_synthetic
+
+        loaded = load_synthetic(users,
+                                users * sites_per_user,
+                                0,
+                                seed,
+                                content_size=content_size)
+        first_site, last_site = loaded['sites']
+        now = datetime.utcnow()
+        with self.app.app_context():
+            owners = db.session.execute(
+                select(User.email, func.min(Site.id)).join(
+                    Site, Site.user_id == User.id).where(
+                        Site.id.between(first_site, last_site)).group_by(
+                            User.id, User.email).order_by(User.id)).all()
+            db.session.execute(insert(GitHubRepo), [{
+                'repo_name': f'bench/site-{site_id}',
+                'repo_url': f'https://github.com/bench/site-{site_id}',
+                'is_private': False,
+                'created_at': now,
+                'updated_at': now,
+                'site_id': site_id
+            } for _, site_id in owners])
+            db.session.commit()
+            slugs = db.session.scalars(
+                select(Site.slug).where(
+                    Site.id.between(first_site, last_site),
+                    Site.is_public.is_(True))).all()
+        return [tuple(owner) for owner in owners], slugs
+
+
+class Worker:
+    """One simulated user: an HTTP session, a seeded RNG and its own site"""
+
+    def __init__(self, bench, email, site_id, seed):
+        from setup_db import SYNTHETIC_PASSWORD
+
+        self.bench = bench
+        self.password = SYNTHETIC_PASSWORD
+        self.email = email
+        self.site_id = site_id
+        self.rng = random.Random(seed)
+        self.http = requests.Session()
+        self.version = None
+
+    def get(self, path, **kwargs):
+        return self.http.get(self.bench.url + path,
+                             allow_redirects=False,
+                             **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.http.post(self.bench.url + path,
+                              allow_redirects=False,
+                              **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.http.put(self.bench.url + path,
+                             allow_redirects=False,
+                             **kwargs)
+
+    def login(self):
+        self.http.cookies.clear()
+        return self.post('/login',
+                         data={
+                             'email': self.email,
+                             'password': self.password
+                         })
+
+    def connect_github(self):
+        return self.get('/api/github/callback', params={'code': self.email})
+
+
+def view_site(worker, slugs):
+    return worker.get(f'/s/{worker.rng.choice(slugs)}/')
+
+
+def welcome(worker, slugs):
+    return worker.get('/welcome')
+
+
+def update_site(worker, slugs):
+    from setup_db import site_html, site_size
+
+    response = worker.put(f'/api/sites/{worker.site_id}',
+                          json={
+                              'base_version': worker.version,
+                              'html_content': site_html(
+                                  site_size(worker.rng, 2048))
+                          })
+    if response.status_code in (200, 409):
+        worker.version = response.json()['version']
+    return response
+
+
+def run_python(worker, slugs):
+    return worker.post(f'/api/sites/{worker.site_id}/run',
+                       json={'code': 'print(sum(range(10000)))'})
+
+
+def login(worker, slugs):
+    return worker.login()
+
+
+def github_status(worker, slugs):
+    return worker.get('/api/github/status')
+
+
+def github_repo_info(worker, slugs):
+    return worker.get('/api/github/repo-info',
+                      params={'site_id': worker.site_id})
+
+
+def github_push(worker, slugs):
+    return worker.post('/api/github/push',
+                       params={'site_id': worker.site_id},
+                       json={'message': 'Benchmark push'})
+
+
+# name -> (request function, needs a logged-in session, needs GitHub)
+SCENARIOS = {
+    'view_site': (view_site, False, False),
+    'welcome': (welcome, True, False),
+    'update_site': (update_site, True, False),
+    'run_python': (run_python, True, False),
+    'login': (login, False, False),
+    'github_status': (github_status, True, True),
+    'github_repo_info': (github_repo_info, True, True),
+    'github_push': (github_push, True, True),
+}
+
+
+def drive(bench, workers, slugs, name, requests_per_worker):
+    """Run one scenario on every worker at once; returns its statistics"""
+    request, needs_login, needs_github = SCENARIOS[name]
+    for worker in workers:
+        if needs_login:
+            worker.login()
+            if needs_github:
+                worker.connect_github()
+        else:
+            worker.http.cookies.clear()
+        worker.version = None
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def work(worker):
+        local = []
+        codes = {}
+        for _ in range(requests_per_worker):
+            started = time.perf_counter()
+            try:
+                code = str(request(worker, slugs).status_code)
+            except requests.RequestException:
+                code = 'error'
+            local.append(time.perf_counter() - started)
+            codes[code] = codes.get(code, 0) + 1
+        with lock:
+            latencies.extend(local)
+            for code, count in codes.items():
+                statuses[code] = statuses.get(code, 0) + count
+
+    del bench.query_counts[:]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(len(workers)) as pool:
+        list(pool.map(work, workers))
+    elapsed = time.perf_counter() - started
+    queries = list(bench.query_counts)
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'concurrency': len(workers),
+        'seconds': round(elapsed, 4),
+        'throughput': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2)
+        if queries else None,
+        'max_queries': max(queries) if queries else None,
+        'statuses': dict(sorted(statuses.items())),
+        'errors': sum(n for code, n in statuses.items()
+                      if code == 'error' or code >= '500')
+    }
+
+
+def run(database_url, scenarios, concurrency, requests_per_worker, users,
+        sites_per_user, content_size, seed, github_latency=0.0,
+        warmup=5):
+    """Boot, seed and benchmark against one database"""
+    bench = Bench(database_url, github_latency)
+    bench.boot()
+    try:
+        owners, slugs = bench.seed(users, sites_per_user, content_size, seed)
+        if len(owners) < concurrency:
+            raise RuntimeError(f'Only {len(owners)} seeded users own a site; '
+                               'use more --users')
+        workers = [
+            Worker(bench, email, site_id, seed + i)
+            for i, (email, site_id) in enumerate(owners[:concurrency])
+        ]
+        results = {}
+        for name in scenarios:
+            if warmup:
+                drive(bench, workers[:1], slugs, name, warmup)
+            results[name] = drive(bench, workers, slugs, name,
+                                  requests_per_worker)
+            print(f"  {name:<18} {results[name]['p50_ms']:>9.2f} ms p50 "
+                  f"{results[name]['p95_ms']:>9.2f} ms p95 "
+                  f"{results[name]['throughput']:>9.1f} req/s "
+                  f"{results[name]['queries_per_request']} q/req",
+                  file=sys.stderr)
+        return {
+            'dialect': database_url.split(':', 1)[0].split('+', 1)[0],
+            'scenarios': results
+        }
+    finally:
+        bench.stop()
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
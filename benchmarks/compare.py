@@ -0,0 +1,63 @@
+import json
+
+# metric -> True if bigger is better
+METRICS = {
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'throughput': True,
+    'queries_per_request': False,
+}
+
+# Queries per request are counted exactly, so any growth beyond noise from
+# background flushes is a regression regardless of the latency threshold.
+QUERY_SLACK = 0.5
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(base, new, threshold=0.1):
+    """Rows of ``(database, scenario, metric, old, new, change, regressed)``.
+
+    Latency and throughput regress when they get worse by more than
+    ``threshold`` (a fraction); queries per request regress when they grow
+    by more than ``QUERY_SLACK``.
+    """
+    rows = []
+    for database, result in new['databases'].items():
+        old_result = base['databases'].get(database)
+        if old_result is None:
+            continue
+        for scenario, stats in result['scenarios'].items():
+            old_stats = old_result['scenarios'].get(scenario)
+            if old_stats is None:
+                continue
+            for metric, higher_is_better in METRICS.items():
+                old, value = old_stats.get(metric), stats.get(metric)
+                if old is None or value is None:
+                    continue
+                change = (value - old) / old if old else 0.0
+                if metric == 'queries_per_request':
+                    regressed = value - old > QUERY_SLACK
+                elif higher_is_better:
+                    regressed = change < -threshold
+                else:
+                    regressed = change > threshold
+                rows.append((database, scenario, metric, old, value, change,
+                             regressed))
+    return rows
+
+
+def report(rows):
+    lines = [
+        f"{'database':<10} {'scenario':<18} {'metric':<20} "
+        f"{'base':>10} {'new':>10} {'change':>8}"
+    ]
+    for database, scenario, metric, old, value, change, regressed in rows:
+        lines.append(f'{database:<10} {scenario:<18} {metric:<20} '
+                     f'{old:>10} {value:>10} {change:>+8.1%}'
+                     f"{'  REGRESSION' if regressed else ''}")
+    return '\n'.join(lines)
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import re
+import threading
+import time
+
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+
+def _sha(value):
+    return hashlib.sha1(
+        json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _blob_sha(content):
+    data = content.encode('utf-8')
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+class FakeGitHub:
+    """In-process stand-in for the GitHub OAuth and REST endpoints Spaces uses.
+
+    It serves the token exchange, ``/user``, repository lookup/creation and
+    the Git Data calls made by ``github_client.push_files``, keeping trees
+    and commits in memory. ``latency`` (seconds) is added to every response
+    to mimic the network round trip to the real API.
+
+    Tests steer it through ``missing`` (repositories that answer 404),
+    ``renamed`` (old full name -> new full name) and ``revoked`` (tokens
+    that answer 401).
+    """
+
+    def __init__(self, latency=0.0, host='127.0.0.1'):
+        self.latency = latency
+        self.host = host
+        self.url = None
+        self.calls = 0
+        self.missing = set()
+        self.renamed = {}
+        self.revoked = set()
+        # Paths sent in each tree creation request, oldest first.
+        self.posted_trees = []
+        self._repos = {}
+        self._trees = {}
+        self._commits = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        self._server = make_server(self.host, 0, self._wsgi, threaded=True)
+        self.url = f'http://{self.host}:{self._server.server_port}'
+        threading.Thread(target=self._server.serve_forever,
+                         name='fake-github',
+                         daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+    def _json(self, data, status=200):
+        return Response(json.dumps(data),
+                        status,
+                        content_type='application/json',
+                        headers={
+                            'X-RateLimit-Limit': '5000',
+                            'X-RateLimit-Remaining': '4999'
+                        })
+
+    def _repo(self, full_name):
+        with self._lock:
+            repo = self._repos.get(full_name)
+            if repo is None:
+                tree = {'README.md': _blob_sha('')}
+                tree_sha = _sha(tree)
+                self._trees[tree_sha] = tree
+                commit = {'tree': tree_sha, 'parents': []}
+                commit_sha = _sha(commit)
+                self._commits[commit_sha] = commit
+                repo = self._repos[full_name] = {'ref': commit_sha}
+            return repo
+
+    def head(self, full_name):
+        """``(commit sha, {path: blob sha})`` of the repository's main"""
+        with self._lock:
+            commit_sha = self._repos[full_name]['ref']
+            return commit_sha, dict(
+                self._trees[self._commits[commit_sha]['tree']])
+
+    def commits(self, full_name):
+        """Number of commits reachable from the repository's main"""
+        with self._lock:
+            count, sha = 0, self._repos[full_name]['ref']
+            while sha is not None:
+                count += 1
+                parents = self._commits[sha]['parents']
+                sha = parents[0] if parents else None
+            return count
+
+    def _repo_json(self, full_name):
+        full_name = self.renamed.get(full_name, full_name)
+        owner, name = full_name.split('/')
+        return {
+            'full_name': full_name,
+            'name': name,
+            'private': False,
+            'html_url': f'https://github.com/{full_name}',
+            'url': f'{self.url}/repos/{full_name}',
+            'default_branch': 'main',
+            'owner': {'login': owner}
+        }
+
+    def _wsgi(self, environ, start_response):
+        request = Request(environ)
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        response = self.dispatch(request)
+        return response(environ, start_response)
+
+    def dispatch(self, request):
+        path, method = request.path, request.method
+        body = request.get_json(silent=True) or {}
+        token = request.headers.get('Authorization', '').split(' ')[-1]
+        if token in self.revoked:
+            return self._json({'message': 'Bad credentials'}, 401)
+
+        if path == '/login/oauth/access_token':
+            code = request.form.get('code') or 'bench'
+            return self._json({'access_token': f'gho_{code}',
+                               'token_type': 'bearer'})
+        if path == '/user':
+            return self._json({'login': 'bench', 'url': f'{self.url}/user'})
+        if path == '/user/repos' and method == 'POST':
+            full_name = f"bench/{body['name']}"
+            self._repo(full_name)
+            return self._json(self._repo_json(full_name), 201)
+
+        match = re.match(r'^/repos/([^/]+/[^/]+)(/.*)?$', path)
+        if not match:
+            return self._json({'message': 'Not Found'}, 404)
+        full_name, rest = match.group(1), match.group(2) or ''
+        if full_name in self.missing:
+            return self._json({'message': 'Not Found'}, 404)
+        repo = self._repo(full_name)
+        base = f'{self.url}/repos/{full_name}'
+
+        if rest == '' and method == 'GET':
+            return self._json(self._repo_json(full_name))
+        if rest == '/branches/main':
+            head = repo['ref']
+            tree_sha = self._commits[head]['tree']
+            return self._json({
+                'name': 'main',
+                'commit': {
+                    'sha': head,
+                    'url': f'{base}/commits/{head}',
+                    'commit': {
+                        'sha': head,
+                        'url': f'{base}/git/commits/{head}',
+                        'tree': {
+                            'sha': tree_sha,
+                            'url': f'{base}/git/trees/{tree_sha}'
+                        }
+                    }
+                }
+            })
+        if rest.startswith('/git/trees/') and method == 'GET':
+            tree_sha = rest.rsplit('/', 1)[1]
+            tree = self._trees.get(tree_sha)
+            if tree is None:
+                return self._json({'message': 'Not Found'}, 404)
+            return self._json({
+                'sha': tree_sha,
+                'tree': [{
+                    'path': path,
+                    'sha': sha,
+                    'type': 'blob',
+                    'mode': '100644'
+                } for path, sha in tree.items()]
+            })
+        if rest == '/git/trees' and method == 'POST':
+            with self._lock:
+                self.posted_trees.append(
+                    [element['path'] for element in body.get('tree', [])])
+                tree = dict(self._trees.get(body.get('base_tree'), {}))
+                for element in body.get('tree', []):
+                    tree[element['path']] = _blob_sha(element['content'])
+                tree_sha = _sha(tree)
+                self._trees[tree_sha] = tree
+            return self._json({'sha': tree_sha, 'tree': []}, 201)
+        if rest == '/git/commits' and method == 'POST':
+            commit = {
+                'tree': body['tree'],
+                'parents': body['parents'],
+                'message': body.get('message')
+            }
+            commit_sha = _sha(commit)
+            with self._lock:
+                self._commits[commit_sha] = commit
+            return self._json({'sha': commit_sha}, 201)
+        if rest in ('/git/refs', '/git/refs/heads/main'):
+            if method in ('PATCH', 'POST'):
+                repo['ref'] = body['sha']
+            return self._json({
+                'ref': 'refs/heads/main',
+                'url': f'{base}/git/refs/heads/main',
+                'object': {
+                    'sha': repo['ref'],
+                    'type': 'commit'
+                }
+            })
+        return self._json({'message': f'Unhandled {method} {path}'}, 404)
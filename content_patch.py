@@ -0,0 +1,35 @@
+class PatchError(ValueError):
+    """Raised when a patch does not apply to the text it was made against"""
+
+
+def apply_patch(text, ops):
+    """Apply a list of ``[start, end, insert]`` splices to ``text``.
+
+    Offsets count UTF-16 code units, which is what the browser's string
+    indexes use, and refer to the original text. Splices must be sorted and
+    must not overlap.
+    """
+    if not isinstance(ops, list):
+        raise PatchError('Patch must be a list of splices')
+
+    data = text.encode('utf-16-le', 'surrogatepass')
+    length = len(data) // 2
+    pieces = []
+    position = 0
+    for op in ops:
+        if (not isinstance(op, list) or len(op) != 3
+                or not all(isinstance(n, int) for n in op[:2])
+                or not isinstance(op[2], str)):
+            raise PatchError('Each splice must be [start, end, text]')
+        start, end, insert = op
+        if start < position or end < start or end > length:
+            raise PatchError('Splice is out of range')
+        pieces.append(data[position * 2:start * 2])
+        pieces.append(insert.encode('utf-16-le', 'surrogatepass'))
+        position = end
+    pieces.append(data[position * 2:])
+
+    try:
+        return b''.join(pieces).decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise PatchError('Patch splits a character')
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, ContentBlob, SiteRevision
+
+CONTENT_CACHE_SIZE = int(os.getenv('CONTENT_CACHE_SIZE', '1024'))
+CONTENT_COMPRESS_LEVEL = int(os.getenv('CONTENT_COMPRESS_LEVEL', '6'))
+
+
+def content_hash(text):
+    """SHA-256 of the UTF-8 encoded text; the blob key and a stable ETag"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ContentStore:
+    """Content-addressed, zlib-compressed storage for site content.
+
+    Each distinct text is stored once in ``content_blob`` under its hash and
+    site history is a list of ``site_revision`` rows pointing at blobs.
+    Blobs never change, so hashes known to exist and decompressed texts are
+    kept in small in-process LRUs.
+    """
+
+    def __init__(self, maxsize=CONTENT_CACHE_SIZE,
+                 level=CONTENT_COMPRESS_LEVEL):
+        self.maxsize = maxsize
+        self.level = level
+        self._known = OrderedDict()
+        self._texts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, cache, key, value):
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.maxsize:
+                cache.popitem(last=False)
+
+    def store(self, *texts):
+        """Add any missing blobs to the session; returns their hashes"""
+        hashes = [content_hash(text) for text in texts]
+        with self._lock:
+            missing = {
+                h: text
+                for h, text in zip(hashes, texts) if h not in self._known
+            }
+        if missing:
+            existing = {
+                h
+                for (h, ) in db.session.query(ContentBlob.hash).filter(
+                    ContentBlob.hash.in_(list(missing)))
+            }
+            for h, text in missing.items():
+                if h in existing:
+                    continue
+                data = text.encode('utf-8')
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(
+                            ContentBlob(hash=h,
+                                        data=zlib.compress(data, self.level),
+                                        size=len(data)))
+                except IntegrityError:
+                    pass  # stored concurrently by another process
+            # Blobs added here only count as known once a later lookup
+            # finds them committed.
+            for h in existing:
+                self._remember(self._known, h, True)
+        return hashes
+
+    def load(self, h):
+        """Text of the blob with hash ``h``, or None"""
+        with self._lock:
+            text = self._texts.get(h)
+        if text is not None:
+            return text
+        blob = db.session.get(ContentBlob, h)
+        if blob is None:
+            return None
+        text = zlib.decompress(blob.data).decode('utf-8')
+        self._remember(self._texts, h, text)
+        return text
+
+    def record_revision(self, site_id, version, html_content,
+                        python_content):
+        """Add a revision row (and its blobs) to the current transaction"""
+        html_hash, python_hash = self.store(html_content, python_content)
+        db.session.add(
+            SiteRevision(site_id=site_id,
+                         version=version,
+                         html_hash=html_hash,
+                         python_hash=python_hash))
+
+    def revision_content(self, revision):
+        return self.load(revision.html_hash), self.load(
+            revision.python_hash)
+
+    def stats(self):
+        with self._lock:
+            return {'known': len(self._known), 'texts': len(self._texts)}
+
+
+content_store = ContentStore()
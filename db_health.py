@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import text
+
+HEALTHY = 'healthy'
+DEGRADED = 'degraded'
+DOWN = 'down'
+
+DB_HEALTH_INTERVAL = float(os.getenv('DB_HEALTH_INTERVAL', '5'))
+DB_HEALTH_SLOW_MS = float(os.getenv('DB_HEALTH_SLOW_MS', '500'))
+DB_HEALTH_FAILURE_THRESHOLD = int(os.getenv('DB_HEALTH_FAILURE_THRESHOLD', '3'))
+
+
+class DatabaseHealthMonitor:
+    """Probe the database in the background and publish a cached state.
+
+    Requests never touch the pool to find out whether the database is up;
+    they read ``available``. After ``failure_threshold`` consecutive failed
+    probes the breaker opens and the state becomes ``down`` until a probe
+    succeeds again.
+    """
+
+    def __init__(self,
+                 db,
+                 interval=DB_HEALTH_INTERVAL,
+                 slow_ms=DB_HEALTH_SLOW_MS,
+                 failure_threshold=DB_HEALTH_FAILURE_THRESHOLD):
+        self.db = db
+        self.interval = interval
+        self.slow_ms = slow_ms
+        self.failure_threshold = failure_threshold
+        self.app = None
+        self.state = HEALTHY
+        self.breaker_open = False
+        self.breaker_trips = 0
+        self.consecutive_failures = 0
+        self.probes = 0
+        self.probe_failures = 0
+        self.last_probe_at = None
+        self.last_error = None
+        self._durations = deque(maxlen=100)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['db_health'] = self
+        app.before_request(self.ensure_started)
+
+    def ensure_started(self):
+        """Start the probe thread on the first request of this process"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run,
+                                            name='db-health-monitor',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def available(self):
+        return not self.breaker_open
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+    def probe(self):
+        """Run a single ``SELECT 1`` and update the published state"""
+        started = time.perf_counter()
+        error = None
+        try:
+            with self.app.app_context():
+                with self.db.engine.connect() as conn:
+                    conn.execute(text('SELECT 1'))
+        except Exception as e:
+            error = e
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            self.probes += 1
+            self.last_probe_at = time.time()
+            self._durations.append(duration_ms)
+            if error is None:
+                self.consecutive_failures = 0
+                self.breaker_open = False
+                self.last_error = None
+                self.state = DEGRADED if duration_ms > self.slow_ms else HEALTHY
+            else:
+                self.probe_failures += 1
+                self.consecutive_failures += 1
+                self.last_error = str(error)
+                if self.consecutive_failures >= self.failure_threshold:
+                    if not self.breaker_open:
+                        self.breaker_trips += 1
+                        self.app.logger.error(
+                            f"Database circuit breaker opened: {error}")
+                    self.breaker_open = True
+                    self.state = DOWN
+                else:
+                    self.state = DEGRADED
+        return error is None
+
+    def snapshot(self):
+        with self._lock:
+            durations = sorted(self._durations)
+            return {
+                'state': self.state,
+                'breaker_open': self.breaker_open,
+                'breaker_trips': self.breaker_trips,
+                'consecutive_failures': self.consecutive_failures,
+                'probes': self.probes,
+                'probe_failures': self.probe_failures,
+                'last_probe_at': self.last_probe_at,
+                'last_error': self.last_error,
+                'probe_ms': {
+                    'last': self._durations[-1] if self._durations else None,
+                    'avg': sum(durations) / len(durations)
+                    if durations else None,
+                    'max': durations[-1] if durations else None,
+                }
+            }
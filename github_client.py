@@ -0,0 +1,245 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from github import Github, GithubException, InputGitTreeElement
+
+from http_client import HTTP_READ_TIMEOUT, HTTP_POOL_PER_HOST, make_retry
+from tracing import tracer, CLIENT
+
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+# A push makes three dependent writes (tree, commit, ref); PyGithub's default
+# one second spacing between writes would dominate its latency.
+GITHUB_SECONDS_BETWEEN_WRITES = float(
+    os.getenv('GITHUB_SECONDS_BETWEEN_WRITES', '0.25'))
+GITHUB_CACHE_TTL = float(os.getenv('GITHUB_CACHE_TTL', '60'))
+GITHUB_CLIENT_CACHE_SIZE = int(os.getenv('GITHUB_CLIENT_CACHE_SIZE', '256'))
+
+
+def get_client(access_token):
+    """Create a PyGithub client for ``access_token``"""
+    return Github(access_token,
+                  base_url=GITHUB_API_URL,
+                  timeout=int(HTTP_READ_TIMEOUT),
+                  retry=make_retry(),
+                  pool_size=HTTP_POOL_PER_HOST,
+                  seconds_between_writes=GITHUB_SECONDS_BETWEEN_WRITES)
+
+
+class GitHubCache:
+    """Per-token PyGithub clients plus a TTL cache of user and repo objects.
+
+    A fresh entry is returned without touching GitHub. Once its TTL expires
+    the object is revalidated with ``If-None-Match``; a 304 does not count
+    against the rate limit and keeps the cached object.
+    """
+
+    def __init__(self,
+                 ttl=GITHUB_CACHE_TTL,
+                 max_clients=GITHUB_CLIENT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_clients = max_clients
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.refreshed = 0
+        self._clients = OrderedDict()
+        self._entries = {}
+        self._rate_limits = {}
+        self._lock = threading.Lock()
+
+    def client(self, access_token):
+        with self._lock:
+            g = self._clients.get(access_token)
+            if g is None:
+                g = self._clients[access_token] = get_client(access_token)
+            self._clients.move_to_end(access_token)
+            evicted = []
+            while len(self._clients) > self.max_clients:
+                evicted.append(self._clients.popitem(last=False)[0])
+        for token in evicted:
+            self.invalidate_token(token)
+        return g
+
+    def user(self, access_token):
+        """The authenticated user for ``access_token``"""
+
+        def fetch():
+            user = self.client(access_token).get_user()
+            user.login  # complete the lazy object so it carries an ETag
+            return user
+
+        return self._lookup(access_token, ('user', None), fetch)
+
+    def repo(self, access_token, full_name):
+        return self._lookup(
+            access_token, ('repo', full_name),
+            lambda: self.client(access_token).get_repo(full_name))
+
+    def _lookup(self, access_token, kind, fetch):
+        key = (access_token, ) + kind
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self.hits += 1
+                return entry[0]
+        if entry is None:
+            with tracer.span(f'github.get_{kind[0]}', kind=CLIENT):
+                obj = fetch()
+            with self._lock:
+                self.misses += 1
+        else:
+            obj = entry[0]
+            try:
+                with tracer.span(f'github.refresh_{kind[0]}',
+                                 kind=CLIENT) as span:
+                    changed = obj.update()
+                    span.set('github.changed', changed)
+            except GithubException:
+                with self._lock:
+                    self._entries.pop(key, None)
+                raise
+            with self._lock:
+                if changed:
+                    self.refreshed += 1
+                else:
+                    self.not_modified += 1
+        with self._lock:
+            self._entries[key] = (obj, time.monotonic() + self.ttl)
+        self._record_rate_limit(access_token)
+        return obj
+
+    def _record_rate_limit(self, access_token):
+        try:
+            remaining, limit = self.client(access_token).rate_limiting
+        except Exception:
+            return
+        with self._lock:
+            self._rate_limits[access_token] = (remaining, limit)
+
+    def rate_limit(self, access_token):
+        """Last seen ``(remaining, limit)`` for a token, if any"""
+        with self._lock:
+            return self._rate_limits.get(access_token)
+
+    def invalidate_token(self, access_token):
+        with self._lock:
+            g = self._clients.pop(access_token, None)
+            self._rate_limits.pop(access_token, None)
+            for key in [k for k in self._entries if k[0] == access_token]:
+                del self._entries[key]
+        if g is not None:
+            g.close()
+
+    def invalidate_repo(self, full_name):
+        with self._lock:
+            for key in [
+                    k for k in self._entries
+                    if k[1] == 'repo' and k[2] == full_name
+            ]:
+                del self._entries[key]
+
+    def invalidate_user(self, access_token):
+        with self._lock:
+            self._entries.pop((access_token, 'user', None), None)
+
+    def stats(self):
+        with self._lock:
+            lookups = (self.hits + self.misses + self.not_modified +
+                       self.refreshed)
+            remaining = [r for r, _ in self._rate_limits.values()]
+            return {
+                'clients': len(self._clients),
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'refreshed': self.refreshed,
+                'hit_rate': (self.hits + self.not_modified) / lookups
+                if lookups else None,
+                'rate_limit_remaining_min': min(remaining)
+                if remaining else None
+            }
+
+
+github_cache = GitHubCache()
+
+
+def git_blob_sha(content):
+    """Compute the SHA git assigns to a blob holding ``content``"""
+    data = content.encode('utf-8')
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+def push_files(repo, files, message):
+    """Commit ``files`` (path -> text) to the default branch in one commit.
+
+    Uses the Git Data API: the current tree is compared against locally
+    computed blob SHAs so unchanged files are skipped, then a single tree,
+    commit and ref update are made. Returns the new commit SHA and the
+    changed paths, or ``None`` for the SHA when nothing changed.
+    """
+    with tracer.span('github.push_files',
+                     kind=CLIENT,
+                     **{'github.repo': repo.full_name,
+                        'github.files': len(files)}) as span:
+        sha, changed = _push_files(repo, files, message)
+        span.set('github.changed_files', len(changed))
+        return sha, changed
+
+
+def _span(operation, repo):
+    """Client span around one GitHub API call made for ``repo``"""
+    return tracer.span(f'github.{operation}',
+                       kind=CLIENT,
+                       **{'github.repo': repo.full_name})
+
+
+def _push_files(repo, files, message):
+    branch = repo.default_branch
+    try:
+        with _span('get_branch', repo):
+            head = repo.get_branch(branch).commit.commit
+    except GithubException as e:
+        if e.status not in (404, 409):
+            raise
+        head = None
+
+    current = {}
+    base_tree = None
+    if head is not None:
+        with _span('get_tree', repo):
+            base_tree = repo.get_git_tree(head.tree.sha)
+        current = {
+            element.path: element.sha
+            for element in base_tree.tree if element.type == 'blob'
+        }
+
+    changed = [
+        path for path, content in files.items()
+        if current.get(path) != git_blob_sha(content)
+    ]
+    if not changed:
+        return None, []
+
+    elements = [
+        InputGitTreeElement(path, '100644', 'blob', content=files[path])
+        for path in changed
+    ]
+    with _span('create_tree', repo):
+        tree = (repo.create_git_tree(elements, base_tree)
+                if base_tree is not None else repo.create_git_tree(elements))
+    with _span('create_commit', repo):
+        commit = repo.create_git_commit(message, tree,
+                                        [head] if head is not None else [])
+    if base_tree is not None:
+        with _span('get_ref', repo):
+            ref = repo.get_git_ref(f'heads/{branch}')
+        with _span('update_ref', repo):
+            ref.edit(commit.sha)
+    else:
+        with _span('create_ref', repo):
+            repo.create_git_ref(f'refs/heads/{branch}', commit.sha)
+    return commit.sha, changed
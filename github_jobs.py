@@ -0,0 +1,195 @@
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, update
+
+from models import db, GitHubJob
+from tracing import tracer
+
+GITHUB_JOB_WORKERS = int(os.getenv('GITHUB_JOB_WORKERS', '4'))
+GITHUB_JOB_QUEUE = int(os.getenv('GITHUB_JOB_QUEUE', '64'))
+GITHUB_JOB_RETENTION = float(os.getenv('GITHUB_JOB_RETENTION', '3600'))
+
+
+class JobQueueFull(Exception):
+    """Raised when too many GitHub jobs are already waiting"""
+
+
+class GitHubJobQueue:
+    """Bounded thread pool for GitHub calls made on behalf of a request.
+
+    Jobs are keyed by ``(kind, site_id)`` and at most one job per key runs
+    at a time. Submitting while a job with the same key is still queued
+    coalesces into it with the newer parameters, so a burst of pushes for
+    one site does the work once. A job submitted while another with the
+    same key is running starts when that one finishes, unless ``rerun`` is
+    False, in which case the running job is returned instead.
+
+    Jobs run in the process that accepted them, but their status is kept in
+    the ``github_job`` table so any app process can answer a status poll.
+    Parameters stay in memory and never hold credentials: jobs look up the
+    user's token when they run. Finished jobs are deleted after
+    ``retention`` seconds.
+    """
+
+    def __init__(self,
+                 max_workers=GITHUB_JOB_WORKERS,
+                 max_queued=GITHUB_JOB_QUEUE,
+                 retention=GITHUB_JOB_RETENTION):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.app = None
+        self._executor = None
+        self._queued = {}
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['github_jobs'] = self
+
+    def submit(self, kind, site_id, user_id, fn, params, rerun=True):
+        """Queue ``fn(**params)`` and return the job dict tracking it"""
+        key = (kind, site_id)
+        self._prune()
+        with self._lock:
+            if key in self._queued:
+                job = self._queued[key][0]
+                job['params'] = params
+                job['coalesced'] += 1
+                coalesced = job['coalesced']
+            else:
+                job = None
+        if job is not None:
+            self._save(job['id'], coalesced=coalesced)
+            return job
+        with self._lock:
+            job = self._running.get(key)
+            if job is not None and not rerun:
+                return job
+            if len(self._queued) >= self.max_queued:
+                raise JobQueueFull('Too many GitHub jobs are waiting')
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix='github-job')
+            job = {
+                'id': uuid.uuid4().hex,
+                'kind': kind,
+                'site_id': site_id,
+                'user_id': user_id,
+                'status': 'queued',
+                'params': params,
+                'coalesced': 0,
+                'result': None,
+                'error': None,
+                # The job's span continues the submitting request's trace.
+                'trace_parent': tracer.current()
+            }
+            with db.engine.begin() as conn:
+                conn.execute(
+                    insert(GitHubJob).values(id=job['id'],
+                                             kind=kind,
+                                             site_id=site_id,
+                                             user_id=user_id,
+                                             status='queued',
+                                             coalesced=0,
+                                             created_at=datetime.utcnow()))
+            self._queued[key] = (job, fn)
+            if key not in self._running:
+                self._executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id):
+        """The stored job, whichever process runs it; needs an app context"""
+        row = db.session.execute(
+            select(GitHubJob).where(GitHubJob.id == job_id)).scalar()
+        if row is None:
+            return None
+        return {
+            'id': row.id,
+            'kind': row.kind,
+            'site_id': row.site_id,
+            'user_id': row.user_id,
+            'status': row.status,
+            'coalesced': row.coalesced,
+            'result': json.loads(row.result) if row.result else None,
+            'error': row.error
+        }
+
+    def _save(self, job_id, **values):
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(GitHubJob).where(GitHubJob.id == job_id).values(
+                    **values))
+
+    def _run(self, job, fn):
+        key = (job['kind'], job['site_id'])
+        with self._lock:
+            self._queued.pop(key, None)
+            self._running[key] = job
+            job['status'] = 'running'
+            params = job['params']
+        with self.app.app_context():
+            try:
+                self._save(job['id'], status='running')
+                with tracer.span(f"github_job.{job['kind']}",
+                                 parent=job['trace_parent'],
+                                 **{'job.id': job['id'],
+                                    'job.site_id': job['site_id']}):
+                    job['result'] = fn(**params)
+                job['status'] = 'succeeded'
+            except Exception as e:
+                db.session.rollback()
+                job['error'] = str(e)
+                job['status'] = 'failed'
+                self.app.logger.error(
+                    f"GitHub {job['kind']} job failed: {e}")
+            finally:
+                try:
+                    self._save(job['id'],
+                               status=job['status'],
+                               result=json.dumps(job['result'])
+                               if job['result'] is not None else None,
+                               error=job['error'],
+                               finished_at=datetime.utcnow())
+                except Exception as e:
+                    self.app.logger.error(
+                        f"Could not record GitHub job {job['id']}: {e}")
+                with self._lock:
+                    del self._running[key]
+                    if key in self._queued:
+                        self._executor.submit(self._run,
+                                              *self._queued[key])
+
+    def _prune(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        with db.engine.begin() as conn:
+            conn.execute(
+                delete(GitHubJob).where(GitHubJob.finished_at < cutoff))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': len(self._queued),
+                'running': len(self._running)
+            }
+
+
+def job_status(job):
+    """Public view of a job for the status endpoint"""
+    return {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'coalesced': job['coalesced'],
+        'result': job['result'],
+        'error': job['error']
+    }
+
+
+github_jobs = GitHubJobQueue()
@@ -0,0 +1,171 @@
+import os
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from itertools import zip_longest
+
+from sqlalchemy import or_, update
+
+from models import db, GitHubRepo, Site, User
+
+GITHUB_RECONCILE_INTERVAL = float(
+    os.getenv('GITHUB_RECONCILE_INTERVAL', '300'))
+GITHUB_RECONCILE_BATCH = int(os.getenv('GITHUB_RECONCILE_BATCH', '100'))
+GITHUB_RECONCILE_PER_TOKEN = int(
+    os.getenv('GITHUB_RECONCILE_PER_TOKEN', '20'))
+GITHUB_RECONCILE_MIN_REMAINING = int(
+    os.getenv('GITHUB_RECONCILE_MIN_REMAINING', '500'))
+
+
+def _round_robin(rows):
+    """Interleave rows so consecutive checks use different tokens"""
+    by_token = defaultdict(list)
+    for row in rows:
+        by_token[row[1]].append(row)
+    for group in zip_longest(*by_token.values()):
+        for row in group:
+            if row is not None:
+                yield row
+
+
+class GitHubRepoReconciler:
+    """Periodically checks that linked repositories still exist on GitHub.
+
+    Rows are walked in id order in batches, skipping any verified within the
+    last interval. Each pass checks at most ``per_token`` repositories per
+    token and leaves a token alone once its remaining rate limit drops under
+    ``min_remaining``; skipped rows are picked up by a later pass. Results are
+    stored on the row so ``repo_info`` can answer from the database.
+    """
+
+    def __init__(self,
+                 interval=GITHUB_RECONCILE_INTERVAL,
+                 batch_size=GITHUB_RECONCILE_BATCH,
+                 per_token=GITHUB_RECONCILE_PER_TOKEN,
+                 min_remaining=GITHUB_RECONCILE_MIN_REMAINING):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.per_token = per_token
+        self.min_remaining = min_remaining
+        self.app = None
+        self.passes = 0
+        self.last_pass = {}
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['github_reconciler'] = self
+        if self.interval > 0:
+            app.before_request(self.ensure_started)
+
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run,
+                                            name='github-reconciler',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception as e:
+                self.app.logger.error(f'GitHub reconcile pass failed: {e}')
+
+    def run_once(self):
+        """Verify one pass worth of repositories; needs an app context"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.interval)
+        outcomes = Counter()
+        budget = Counter()
+        query = (db.session.query(GitHubRepo.id, User.github_token,
+                                  GitHubRepo.repo_name, GitHubRepo.repo_url)
+                 .join(Site, GitHubRepo.site_id == Site.id)
+                 .join(User, Site.user_id == User.id)
+                 .filter(or_(GitHubRepo.last_verified_at.is_(None),
+                             GitHubRepo.last_verified_at < cutoff))
+                 .order_by(GitHubRepo.id))
+
+        last_id = 0
+        while True:
+            rows = query.filter(GitHubRepo.id > last_id).limit(
+                self.batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            for repo_id, token, repo_name, repo_url in _round_robin(rows):
+                if not token:
+                    self._record(repo_id, 'auth_error')
+                    outcomes['auth_error'] += 1
+                    continue
+                if budget[token] >= self.per_token or self._throttled(token):
+                    outcomes['deferred'] += 1
+                    continue
+                budget[token] += 1
+                outcomes[self._verify(repo_id, token, repo_name,
+                                      repo_url)] += 1
+            db.session.commit()
+
+        self.passes += 1
+        self.last_pass = dict(outcomes,
+                              finished_at=datetime.utcnow().isoformat())
+        return outcomes
+
+    # PyGithub is imported on first use so app startup does not pay for it.
+
+    def _throttled(self, token):
+        from github_client import github_cache
+        rate = github_cache.rate_limit(token)
+        return rate is not None and rate[0] < self.min_remaining
+
+    def _verify(self, repo_id, token, repo_name, repo_url):
+        from github import GithubException
+        from github_client import github_cache
+        try:
+            repo = github_cache.repo(token, repo_name)
+        except GithubException as e:
+            if e.status == 404:
+                db.session.query(GitHubRepo).filter_by(id=repo_id).delete()
+                return 'deleted'
+            status = 'auth_error' if e.status == 401 else 'error'
+            self._record(repo_id, status)
+            return status
+        except Exception as e:
+            self.app.logger.warning(
+                f'Could not verify repository {repo_name}: {e}')
+            self._record(repo_id, 'error')
+            return 'error'
+
+        if repo.html_url != repo_url:
+            db.session.execute(
+                update(GitHubRepo).where(GitHubRepo.id == repo_id).values(
+                    repo_url=repo.html_url,
+                    last_verified_at=datetime.utcnow(),
+                    verify_status='ok'))
+            return 'updated'
+        self._record(repo_id, 'ok')
+        return 'ok'
+
+    def _record(self, repo_id, status):
+        # Keep updated_at untouched: only real changes to the link bump it.
+        db.session.execute(
+            update(GitHubRepo).where(GitHubRepo.id == repo_id).values(
+                last_verified_at=datetime.utcnow(),
+                verify_status=status,
+                updated_at=GitHubRepo.updated_at))
+
+    def stats(self):
+        return {'passes': self.passes, 'last_pass': self.last_pass}
+
+
+github_reconciler = GitHubRepoReconciler()
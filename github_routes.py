@@ -1,21 +1,24 @@
-from flask import Blueprint, jsonify, request, redirect, url_for, session
+from flask import jsonify, request, redirect, url_for, session
 from flask_login import current_user, login_required
-from github import Github, GithubException
-from dotenv import load_dotenv
-from models import db, GitHubRepo, Site
+from models import db, GitHubRepo, Site, User
+from github_client import github_cache, push_files
+from github_jobs import github_jobs, job_status, JobQueueFull
+from http_client import http
+from save_buffer import save_buffer
+from tracing import tracer, CLIENT
 import os
 import requests
+from sqlalchemy import select, update
 
-load_dotenv()
-
-github_bp = Blueprint('github', __name__)
+# These views are imported on first use; their URL rules are in
+# GITHUB_ROUTES in app.py.
 
 GITHUB_CLIENT_ID = os.getenv('GITHUB_CLIENT_ID')
 GITHUB_CLIENT_SECRET = os.getenv('GITHUB_CLIENT_SECRET')
 GITHUB_CALLBACK_URL = os.getenv('GITHUB_CALLBACK_URL')
+GITHUB_OAUTH_URL = os.getenv('GITHUB_OAUTH_URL', 'https://github.com')
 
 
-@github_bp.route('/api/github/status')
 @login_required
 def github_status():
     """Check GitHub connection status"""
@@ -24,19 +27,18 @@ def github_status():
         return jsonify({'connected': False, 'repo_connected': False})
 
     try:
-        g = Github(access_token)
-        user = g.get_user()
+        user = github_cache.user(access_token)
 
         site_id = session.get('current_site_id')
         if site_id:
-            site = Site.query.get(site_id)
-            if site and site.github_repo:
+            github_repo = GitHubRepo.query.filter_by(site_id=site_id).first()
+            if github_repo:
                 return jsonify({
                     'connected': True,
                     'repo_connected': True,
                     'username': user.login,
-                    'repo_name': site.github_repo.repo_name,
-                    'repo_url': site.github_repo.repo_url
+                    'repo_name': github_repo.repo_name,
+                    'repo_url': github_repo.repo_url
                 })
 
         return jsonify({
@@ -49,22 +51,22 @@ def github_status():
         return jsonify({'connected': False, 'repo_connected': False})
 
 
-@github_bp.route('/api/github/login')
 def github_login():
     """Redirect to GitHub OAuth login"""
-    return redirect(f'https://github.com/login/oauth/authorize?'
+    return redirect(f'{GITHUB_OAUTH_URL}/login/oauth/authorize?'
                     f'client_id={GITHUB_CLIENT_ID}&'
                     f'redirect_uri={GITHUB_CALLBACK_URL}&'
                     f'scope=repo')
 
 
-@github_bp.route('/api/github/callback')
 @login_required
 def github_callback():
     """Handle GitHub OAuth callback"""
     code = request.args.get('code')
 
-    response = requests.post('https://github.com/login/oauth/access_token',
+    try:
+        response = http.post(f'{GITHUB_OAUTH_URL}/login/oauth/access_token',
+                             endpoint='github.oauth_access_token',
                              headers={'Accept': 'application/json'},
                              data={
                                  'client_id': GITHUB_CLIENT_ID,
@@ -72,13 +74,30 @@ def github_callback():
                                  'code': code,
                                  'redirect_uri': GITHUB_CALLBACK_URL
                              })
+    except requests.RequestException as e:
+        print(f'GitHub OAuth request failed: {str(e)}')
+        return 'GitHub is not responding, please try again', 502
 
     data = response.json()
     if 'access_token' in data:
         access_token = data['access_token']
+        for old_token in {session.get('github_token'), current_user.github_token}:
+            if old_token and old_token != access_token:
+                github_cache.invalidate_token(old_token)
         session['github_token'] = access_token
 
         try:
+            if current_user.github_token != access_token:
+                # Verdicts reached with the old token (auth_error above
+                # all) no longer hold; the reconciler checks them again.
+                db.session.execute(
+                    update(GitHubRepo).where(
+                        GitHubRepo.site_id.in_(
+                            select(Site.id).where(
+                                Site.user_id == current_user.id))).values(
+                                    verify_status=None,
+                                    last_verified_at=None,
+                                    updated_at=GitHubRepo.updated_at))
             current_user.github_token = access_token
             db.session.commit()
             return redirect(url_for('welcome'))
@@ -90,7 +109,6 @@ def github_callback():
     return 'Failed to authenticate with GitHub', 400
 
 
-@github_bp.route('/api/github/create-repo', methods=['POST'])
 @login_required
 def create_repo():
     """Create a new GitHub repository"""
@@ -111,7 +129,7 @@ def create_repo():
             return jsonify(
                 {'error': 'No site ID provided. Please select a site.'}), 400
 
-        site = Site.query.get(site_id)
+        site = Site.ownership(site_id).first()
         if not site:
             return jsonify({'error': 'Site not found'}), 404
         if site.user_id != current_user.id:
@@ -119,7 +137,7 @@ def create_repo():
                 {'error':
                  'You do not have permission to access this site'}), 403
 
-        if site.github_repo:
+        if GitHubRepo.query.filter_by(site_id=site.id).first():
             return jsonify({
                 'error':
                 'This site already has a GitHub repository connected'
@@ -136,66 +154,71 @@ def create_repo():
         description = data.get('description', '')
         private = data.get('private', True)
 
-        g = Github(access_token)
-        user = g.get_user()
-        repo = user.create_repo(name=name,
-                                description=description,
-                                private=private,
-                                auto_init=True)
-
-        github_repo = GitHubRepo(repo_name=repo.full_name,
-                                 repo_url=repo.html_url,
-                                 is_private=private,
-                                 site_id=site_id)
-
-        db.session.add(github_repo)
-        db.session.commit()
-
+        job = github_jobs.submit('create_repo',
+                                 site.id,
+                                 current_user.id,
+                                 _create_repo_job, {
+                                     'user_id': current_user.id,
+                                     'site_id': site.id,
+                                     'name': name,
+                                     'description': description,
+                                     'private': private
+                                 },
+                                 rerun=False)
         return jsonify({
-            'message': 'Repository created successfully',
-            'repo_name': repo.full_name,
-            'repo_url': repo.html_url
-        })
-
-    except GithubException as e:
-        return jsonify({'error': str(e)}), 400
+            'message': 'Repository creation started',
+            'job_id': job['id'],
+            'status': job['status']
+        }), 202
+
+    except JobQueueFull:
+        return jsonify({'error':
+                        'GitHub is busy right now, please try again'}), 503
     except Exception as e:
         print(f'Error creating repository: {str(e)}')
-        db.session.rollback()
         return jsonify({'error': 'Failed to create repository'}), 500
-    description = data.get('description', '')
-    private = data.get('private', True)
 
-    try:
-        g = Github(access_token)
-        user = g.get_user()
+
+def _job_token(user_id):
+    """The user's stored GitHub token; jobs never carry one themselves"""
+    access_token = db.session.query(
+        User.github_token).filter_by(id=user_id).scalar()
+    if not access_token:
+        raise ValueError('No GitHub account connected')
+    return access_token
+
+
+def _create_repo_job(user_id, site_id, name, description, private):
+    """Create the repository on GitHub and link it to the site"""
+    if GitHubRepo.query.filter_by(site_id=site_id).first():
+        raise ValueError('This site already has a GitHub repository connected')
+    access_token = _job_token(user_id)
+
+    user = github_cache.user(access_token)
+    with tracer.span('github.create_repo',
+                     kind=CLIENT,
+                     **{'github.repo': name, 'github.private': private}):
         repo = user.create_repo(name=name,
                                 description=description,
                                 private=private,
                                 auto_init=True)
 
-        # Save repo info to database
-        github_repo = GitHubRepo(repo_name=repo.full_name,
-                                 repo_url=repo.html_url,
-                                 is_private=private,
-                                 site_id=site_id)
-
+    github_repo = GitHubRepo(repo_name=repo.full_name,
+                             repo_url=repo.html_url,
+                             is_private=private,
+                             site_id=site_id)
+    try:
         db.session.add(github_repo)
         db.session.commit()
-
-        return jsonify({
-            'message': 'Repository created successfully',
-            'repo_name': repo.full_name,
-            'repo_url': repo.html_url
-        })
-    except GithubException as e:
-        return jsonify({'error': str(e)}), 400
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        return jsonify({'error': f'Database error: {str(e)}'}), 500
+        raise
+    github_cache.invalidate_user(access_token)
+    github_cache.invalidate_repo(repo.full_name)
+
+    return {'repo_name': repo.full_name, 'repo_url': repo.html_url}
 
 
-@github_bp.route('/api/github/repo-info')
 @login_required
 def repo_info():
     """Get information about the connected repository"""
@@ -204,7 +227,7 @@ def repo_info():
         if not site_id:
             return jsonify({'error': 'No site ID provided'}), 400
 
-        site = Site.query.get(site_id)
+        site = Site.ownership(site_id).first()
         if not site:
             return jsonify({'error': 'Site not found'}), 404
         if site.user_id != current_user.id:
@@ -226,27 +249,11 @@ def repo_info():
                 'needs_auth': True
             }), 401
 
-        try:
-            g = Github(access_token)
-            repo = g.get_repo(github_repo.repo_name)
-            if repo.html_url != github_repo.repo_url:
-                github_repo.repo_url = repo.html_url
-                db.session.commit()
-        except GithubException as e:
-            if e.status == 404:
-                db.session.delete(github_repo)
-                db.session.commit()
-                return jsonify({
-                    'error': 'Repository no longer exists on GitHub',
-                    'needs_repo': True
-                }), 404
-            elif e.status == 401:
-                return jsonify({
-                    'error': 'GitHub token is invalid',
-                    'needs_auth': True
-                }), 401
-            else:
-                raise
+        if github_repo.verify_status == 'auth_error':
+            return jsonify({
+                'error': 'GitHub token is invalid',
+                'needs_auth': True
+            }), 401
 
         return jsonify({
             'repo_name':
@@ -260,14 +267,18 @@ def repo_info():
             if github_repo.created_at else None,
             'updated_at':
             github_repo.updated_at.isoformat()
-            if github_repo.updated_at else None
+            if github_repo.updated_at else None,
+            'last_verified_at':
+            github_repo.last_verified_at.isoformat()
+            if github_repo.last_verified_at else None,
+            'verify_status':
+            github_repo.verify_status
         })
     except Exception as e:
         print(f'Error getting repo info: {str(e)}')
         return jsonify({'error': 'Failed to get repository information'}), 500
 
 
-@github_bp.route('/api/github/push', methods=['POST'])
 @login_required
 def push_changes():
     """Push changes to GitHub repository"""
@@ -284,7 +295,7 @@ def push_changes():
         if not site_id:
             return jsonify({'error': 'No site ID provided'}), 400
 
-        site = Site.query.get(site_id)
+        site = Site.ownership(site_id).first()
         if not site:
             return jsonify({'error': 'Site not found'}), 404
         if site.user_id != current_user.id:
@@ -303,38 +314,59 @@ def push_changes():
 
         commit_message = data.get('message', 'Update from Spaces')
 
-        g = Github(access_token)
-        repo = g.get_repo(github_repo.repo_name)
-
-        files_to_update = {
-            'index.html': site.html_content or '',
-            'main.py': site.python_content or ''
-        }
-
-        for file_path, content in files_to_update.items():
-            try:
-                file = repo.get_contents(file_path)
-                repo.update_file(file_path, commit_message, content, file.sha)
-            except GithubException as e:
-                if e.status == 404:
-                    repo.create_file(file_path, commit_message, content)
-                else:
-                    raise
-
+        job = github_jobs.submit(
+            'push', site.id, current_user.id, _push_job, {
+                'user_id': current_user.id,
+                'site_id': site.id,
+                'repo_name': github_repo.repo_name,
+                'repo_url': github_repo.repo_url,
+                'message': commit_message
+            })
         return jsonify({
-            'message': 'Changes pushed successfully',
-            'repo_url': github_repo.repo_url
-        })
-
-    except GithubException as e:
-        print(f'GitHub error: {str(e)}')
-        return jsonify({'error': str(e)}), 400
+            'message': 'Push started',
+            'job_id': job['id'],
+            'status': job['status']
+        }), 202
+
+    except JobQueueFull:
+        return jsonify({'error':
+                        'GitHub is busy right now, please try again'}), 503
     except Exception as e:
         print(f'Error pushing changes: {str(e)}')
         return jsonify({'error': 'Failed to push changes'}), 500
 
 
-@github_bp.route('/api/github/disconnect-repo', methods=['POST'])
+def _push_job(user_id, site_id, repo_name, repo_url, message):
+    """Push the site's current content, read when the job starts"""
+    site = Site.with_content().get(site_id)
+    if not site:
+        raise ValueError('Site not found')
+    save_buffer.overlay(site)
+
+    repo = github_cache.repo(_job_token(user_id), repo_name)
+
+    files_to_update = {
+        'index.html': site.html_content or '',
+        'main.py': site.python_content or ''
+    }
+
+    commit_sha, changed = push_files(repo, files_to_update, message)
+    return {
+        'repo_url': repo_url,
+        'commit_sha': commit_sha,
+        'changed': changed
+    }
+
+
+@login_required
+def job_info(job_id):
+    """Report the status of a background GitHub job"""
+    job = github_jobs.get(job_id)
+    if not job or job['user_id'] != current_user.id:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_status(job))
+
+
 @login_required
 def disconnect_repo():
     """Disconnect the GitHub repository from the site"""
@@ -344,7 +376,7 @@ def disconnect_repo():
             site_id = session.get('current_site_id')
             if not site_id:
                 return jsonify({'error': 'No site ID provided'}), 400
-        site = Site.query.get(site_id)
+        site = Site.ownership(site_id).first()
         if not site:
             return jsonify({'error': 'Site not found'}), 404
         if site.user_id != current_user.id:
@@ -352,8 +384,10 @@ def disconnect_repo():
         github_repo = GitHubRepo.query.filter_by(site_id=site.id).first()
         if not github_repo:
             return jsonify({'error': 'No repository connected'}), 404
+        repo_name = github_repo.repo_name
         db.session.delete(github_repo)
         db.session.commit()
+        github_cache.invalidate_repo(repo_name)
         return jsonify({'message': 'Repository disconnected successfully'})
     except Exception as e:
         db.session.rollback()
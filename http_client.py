@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+from urllib3.util.retry import Retry
+
+from tracing import tracer, CLIENT
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', '10'))
+HTTP_POOL_PER_HOST = int(os.getenv('HTTP_POOL_PER_HOST', '10'))
+HTTP_POOL_TIMEOUT = float(os.getenv('HTTP_POOL_TIMEOUT', '5'))
+
+
+def make_retry(retries=HTTP_RETRIES):
+    """Bounded retry policy with jittered exponential backoff.
+
+    Connection failures are retried for every method since the request never
+    reached the server; read errors and 5xx answers only for idempotent
+    methods, so an OAuth code is never exchanged twice.
+    """
+    return Retry(total=retries,
+                 connect=retries,
+                 read=retries,
+                 status=retries,
+                 status_forcelist=(502, 503, 504),
+                 allowed_methods=frozenset({'GET', 'HEAD', 'OPTIONS'}),
+                 backoff_factor=0.2,
+                 backoff_jitter=0.3,
+                 raise_on_status=False)
+
+
+class _PoolTimeout:
+    """Connection pool mixin: wait at most ``pool_timeout`` for a connection"""
+
+    pool_timeout = HTTP_POOL_TIMEOUT
+
+    def _get_conn(self, timeout=None):
+        return super()._get_conn(self.pool_timeout
+                                 if timeout is None else timeout)
+
+
+class BoundedPoolAdapter(HTTPAdapter):
+    """Blocking ``HTTPAdapter`` whose callers wait at most ``pool_timeout``
+    for a free connection.
+
+    requests never passes urllib3 a pool timeout, so with ``pool_block`` a
+    full pool would otherwise be waited on forever. Running out of time
+    raises ``requests.ConnectionError``.
+    """
+
+    def __init__(self, pool_timeout=HTTP_POOL_TIMEOUT, **kwargs):
+        self.pool_timeout = pool_timeout
+        super().__init__(pool_block=True, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        timeout = {'pool_timeout': self.pool_timeout}
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('HTTPConnectionPool',
+                         (_PoolTimeout, HTTPConnectionPool), timeout),
+            'https': type('HTTPSConnectionPool',
+                          (_PoolTimeout, HTTPSConnectionPool), timeout)
+        }
+
+    def send(self, request, **kwargs):
+        try:
+            return super().send(request, **kwargs)
+        except EmptyPoolError as e:
+            raise requests.ConnectionError(e, request=request)
+
+
+class HTTPClient:
+    """Shared keep-alive session for calls to Slack and GitHub.
+
+    Connections are pooled per host and capped at ``per_host`` (callers
+    wait up to ``pool_timeout`` for a free connection rather than opening
+    more). Every request gets a connect/read timeout and latency is recorded
+    per endpoint.
+    """
+
+    def __init__(self,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT,
+                 read_timeout=HTTP_READ_TIMEOUT,
+                 retries=HTTP_RETRIES,
+                 hosts=HTTP_POOL_HOSTS,
+                 per_host=HTTP_POOL_PER_HOST,
+                 pool_timeout=HTTP_POOL_TIMEOUT):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = BoundedPoolAdapter(pool_timeout=pool_timeout,
+                                     pool_connections=hosts,
+                                     pool_maxsize=per_host,
+                                     max_retries=make_retry(retries))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, endpoint=None, **kwargs):
+        """Send a request; ``endpoint`` names it in the latency metrics"""
+        if endpoint is None:
+            parts = urlsplit(url)
+            endpoint = f'{method} {parts.netloc}{parts.path}'
+        kwargs.setdefault('timeout', self.timeout)
+        started = time.perf_counter()
+        failed = True
+        with tracer.span('http.request',
+                         kind=CLIENT,
+                         **{
+                             'http.method': method,
+                             'http.url': url,
+                             'http.endpoint': endpoint
+                         }) as span:
+            try:
+                response = self.session.request(method, url, **kwargs)
+                failed = response.status_code >= 500
+                span.set('http.status_code', response.status_code)
+                return response
+            finally:
+                self._record(endpoint, time.perf_counter() - started, failed)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def _record(self, endpoint, seconds, failed):
+        ms = seconds * 1000
+        with self._lock:
+            metric = self._metrics.get(endpoint)
+            if metric is None:
+                metric = self._metrics[endpoint] = {
+                    'count': 0,
+                    'errors': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0
+                }
+            metric['count'] += 1
+            metric['errors'] += failed
+            metric['total_ms'] += ms
+            metric['max_ms'] = max(metric['max_ms'], ms)
+
+    def stats(self):
+        with self._lock:
+            return {
+                endpoint: dict(metric,
+                               avg_ms=metric['total_ms'] / metric['count'])
+                for endpoint, metric in self._metrics.items()
+            }
+
+
+http = HTTPClient()
@@ -0,0 +1,37 @@
+import os
+import re
+import subprocess
+import sys
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def measure_imports(module='app', runs=3):
+    """Import ``module`` in fresh interpreters under ``-X importtime``.
+
+    Returns the total import time in milliseconds and the cumulative time
+    of each module ``module`` imports directly, slowest first. Each figure
+    is the best of ``runs`` runs to keep noise down.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    best_total = None
+    best = {}
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=here, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        for line in result.stderr.splitlines():
+            match = _LINE.match(line)
+            if match is None:
+                continue
+            cumulative = int(match.group(2)) / 1000
+            depth = (len(match.group(3)) - 1) // 2
+            name = match.group(4)
+            if depth == 0 and name == module:
+                best_total = (cumulative if best_total is None else min(
+                    best_total, cumulative))
+            elif depth == 1:
+                best[name] = min(best.get(name, cumulative), cumulative)
+    return best_total, sorted(best.items(), key=lambda item: -item[1])
@@ -0,0 +1,58 @@
+import click
+from werkzeug.utils import cached_property, import_string
+
+
+class LazyView:
+    """View function that is only imported the first time it is called"""
+
+    def __init__(self, import_name):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+def add_lazy_routes(app, module, routes):
+    """Register ``(rule, view name, methods)`` routes of ``module`` lazily.
+
+    Endpoints are named ``<module prefix>.<view name>`` (``github_routes``
+    gives ``github.github_login``), as if the module were a blueprint.
+    """
+    prefix = module.split('_')[0]
+    for rule, name, methods in routes:
+        app.add_url_rule(rule,
+                         f'{prefix}.{name}',
+                         LazyView(f'{module}.{name}'),
+                         methods=methods)
+
+
+class LazyGroup(click.Group):
+    """CLI group whose commands, options and callback come from ``load()``,
+    which is called the first time the group is used"""
+
+    def __init__(self, name, load, **kwargs):
+        super().__init__(name, **kwargs)
+        self._load = load
+        self._group = None
+
+    def _real(self):
+        if self._group is None:
+            self._group = self._load()
+        return self._group
+
+    def list_commands(self, ctx):
+        return self._real().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._real().get_command(ctx, name)
+
+    def parse_args(self, ctx, args):
+        group = self._real()
+        self.params = group.params
+        self.callback = group.callback
+        return super().parse_args(ctx, args)
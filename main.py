@@ -1,8 +1,7 @@
-
 from app import app
 from flask import jsonify
 
-@app.route('/')
+@app.route('/healthz')
 def health_check():
     return jsonify({'status': 'ok'}), 200
 
@@ -0,0 +1,264 @@
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy.pool import QueuePool
+
+from query_timing import query_timing
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+CHECKOUT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+RUN_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Fold the shards of exited threads after this many new shards, so an
+# instance nobody scrapes doesn't keep one per connection thread.
+FOLD_EVERY = 64
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'spaces_http_requests_total':
+    ('counter', 'HTTP requests by endpoint, method and status.', None),
+    'spaces_http_request_duration_seconds':
+    ('histogram', 'Time spent handling a request.', LATENCY_BUCKETS),
+    'spaces_db_queries_total':
+    ('counter', 'SQL statements executed, by endpoint.', None),
+    'spaces_db_query_seconds_total':
+    ('counter', 'Time spent executing SQL statements, by endpoint.', None),
+    'spaces_db_queries_per_request':
+    ('histogram', 'SQL statements executed by one request.',
+     QUERY_COUNT_BUCKETS),
+    'spaces_db_pool_checkout_seconds':
+    ('histogram', 'Time to get a connection from the pool, including '
+     'waiting for a free one.', CHECKOUT_BUCKETS),
+    'spaces_db_pool_checked_out':
+    ('gauge', 'Connections currently checked out of the pool.', None),
+    'spaces_python_run_duration_seconds':
+    ('histogram', 'Duration of user Python runs by outcome.', RUN_BUCKETS),
+}
+
+
+class _Shard:
+    """One thread's counters and histograms; only that thread writes them"""
+
+    __slots__ = ('thread', 'counters', 'histograms')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.counters = {}
+        self.histograms = {}
+
+
+def _merge(counters, histograms, shard):
+    for key, value in dict(shard.counters).items():
+        counters[key] = counters.get(key, 0) + value
+    for key, counts in dict(shard.histograms).items():
+        total = histograms.get(key)
+        if total is None:
+            histograms[key] = list(counts)
+        else:
+            for i, value in enumerate(counts):
+                total[i] += value
+
+
+def _labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+
+def _series(name, labels):
+    return f'{name}{{{_labels(labels)}}}' if labels else name
+
+
+class Metrics:
+    """Prometheus metrics for requests, SQL, the pool and Python runs.
+
+    Every thread records into its own shard without taking a lock; a scrape
+    of ``/metrics`` adds the shards up. Shards of threads that have exited
+    are folded into a retired total, on every scrape and every
+    ``FOLD_EVERY`` new threads, so per-connection server threads don't pile
+    up.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.app = None
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard(None)
+        self._since_fold = 0
+        self._pools = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+        # First, so requests rejected by other hooks are still timed.
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start)
+        app.after_request(self._status)
+        app.teardown_request(self._finish)
+        app.add_url_rule('/metrics', 'metrics', self.scrape)
+        query_timing.subscribe(self._record_query)
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+                self._since_fold += 1
+                if self._since_fold >= FOLD_EVERY:
+                    self._fold()
+            return shard
+
+    def _fold(self):
+        """Merge shards of exited threads into the retired total; hold
+        ``_lock``"""
+        live = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                live.append(shard)
+            else:
+                _merge(self._retired.counters, self._retired.histograms, shard)
+        self._shards = live
+        self._since_fold = 0
+        return live
+
+    def inc(self, name, labels=(), value=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        counts = histograms.get(key)
+        if counts is None:
+            buckets = METRICS[name][2]
+            # One slot per bucket, +Inf, then the sum.
+            counts = histograms[key] = [0] * (len(buckets) + 2)
+        counts[bisect_left(METRICS[name][2], value)] += 1
+        counts[-1] += value
+
+    def track_pool(self, pool):
+        with self._lock:
+            self._pools.add(pool)
+
+    def _start(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+
+    def _status(self, response):
+        g.metrics_status = response.status_code
+        return response
+
+    def _finish(self, exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        endpoint = request.endpoint or 'none'
+        status = g.pop('metrics_status', 500)
+        self.inc('spaces_http_requests_total',
+                 (('endpoint', endpoint), ('method', request.method),
+                  ('status', status)))
+        self.observe('spaces_http_request_duration_seconds',
+                     time.perf_counter() - started, (('endpoint', endpoint), ))
+        self.observe('spaces_db_queries_per_request',
+                     g.pop('metrics_queries', 0), (('endpoint', endpoint), ))
+
+    def _record_query(self, statement, parameters, executemany, started,
+                      elapsed):
+        endpoint = 'background'
+        if has_request_context():
+            endpoint = request.endpoint or 'none'
+            if 'metrics_queries' in g:
+                g.metrics_queries += 1
+        labels = (('endpoint', endpoint), )
+        self.inc('spaces_db_queries_total', labels)
+        self.inc('spaces_db_query_seconds_total', labels, elapsed)
+
+    def observe_checkout(self, seconds):
+        if self.enabled:
+            self.observe('spaces_db_pool_checkout_seconds', seconds)
+
+    def observe_run(self, status):
+        """Record a finished ``python_runner`` run from its exit status"""
+        if not self.enabled or status.get('duration') is None:
+            return
+        if status.get('timed_out'):
+            outcome = 'timeout'
+        else:
+            outcome = 'ok' if status.get('ok') else 'error'
+        self.observe('spaces_python_run_duration_seconds', status['duration'],
+                     (('outcome', outcome), ))
+
+    def collect(self):
+        """Summed ``(counters, histograms)`` over every thread"""
+        with self._lock:
+            live = self._fold()
+            counters = dict(self._retired.counters)
+            histograms = {
+                key: list(counts)
+                for key, counts in self._retired.histograms.items()
+            }
+            pools = list(self._pools)
+        for shard in live:
+            _merge(counters, histograms, shard)
+        for pool in pools:
+            counters[('spaces_db_pool_checked_out', ())] = counters.get(
+                ('spaces_db_pool_checked_out', ()), 0) + pool.checkedout()
+        return counters, histograms
+
+    def render(self):
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind != 'histogram':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{_series(name, labels)} {value}')
+                continue
+            for (metric, labels), counts in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                prefix = _labels(labels) + ',' if labels else ''
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf', ), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} '
+                                 f'{cumulative}')
+                lines.append(f'{_series(name + "_sum", labels)} {counts[-1]}')
+                lines.append(f'{_series(name + "_count", labels)} '
+                             f'{cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def scrape(self):
+        return Response(
+            self.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+metrics = Metrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout took to ``metrics``"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        metrics.track_pool(self)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe_checkout(time.perf_counter() - started)
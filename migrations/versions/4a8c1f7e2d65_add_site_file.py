@@ -0,0 +1,41 @@
+"""Add site_file for multi-file sites
+
+Revision ID: 4a8c1f7e2d65
+Revises: 9f3b6d1e8c42
+Create Date: 2026-10-18 19:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a8c1f7e2d65'
+down_revision = '9f3b6d1e8c42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('site_file',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('site_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['site_id'], ['site.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('site_id', 'name')
+    )
+    with op.batch_alter_table('site_file', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_site_file_site_id'), ['site_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('site_file', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_site_file_site_id'))
+
+    op.drop_table('site_file')
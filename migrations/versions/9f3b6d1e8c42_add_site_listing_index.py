@@ -0,0 +1,26 @@
+"""Add index for keyset pagination of a user's sites
+
+Revision ID: 9f3b6d1e8c42
+Revises: e7a4c2b9d310
+Create Date: 2026-10-18 18:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3b6d1e8c42'
+down_revision = 'e7a4c2b9d310'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('site', schema=None) as batch_op:
+        batch_op.create_index('ix_site_user_updated', ['user_id', 'updated_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('site', schema=None) as batch_op:
+        batch_op.drop_index('ix_site_user_updated')
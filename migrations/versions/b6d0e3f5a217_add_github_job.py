@@ -0,0 +1,43 @@
+"""Add GitHubJob
+
+Revision ID: b6d0e3f5a217
+Revises: 4a8c1f7e2d65
+Create Date: 2026-10-18 20:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d0e3f5a217'
+down_revision = '4a8c1f7e2d65'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('github_job',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('site_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('coalesced', sa.Integer(), nullable=False),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('github_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_github_job_user_id'), ['user_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_github_job_finished_at'), ['finished_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('github_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_github_job_finished_at'))
+        batch_op.drop_index(batch_op.f('ix_github_job_user_id'))
+
+    op.drop_table('github_job')
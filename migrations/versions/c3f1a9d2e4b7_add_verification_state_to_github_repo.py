@@ -0,0 +1,28 @@
+"""Add verification state to GitHubRepo
+
+Revision ID: c3f1a9d2e4b7
+Revises: 8b430b165793
+Create Date: 2026-10-18 17:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f1a9d2e4b7'
+down_revision = '8b430b165793'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('github_repo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_verified_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('verify_status', sa.String(length=20), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('github_repo', schema=None) as batch_op:
+        batch_op.drop_column('verify_status')
+        batch_op.drop_column('last_verified_at')
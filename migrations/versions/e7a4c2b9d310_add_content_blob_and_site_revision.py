@@ -0,0 +1,76 @@
+"""Add content-addressed blobs and site revisions
+
+Revision ID: e7a4c2b9d310
+Revises: 5d2e8b7f1a90
+Create Date: 2026-10-18 18:20:00.000000
+
+"""
+import hashlib
+import zlib
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a4c2b9d310'
+down_revision = '5d2e8b7f1a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    content_blob = op.create_table('content_blob',
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('hash')
+    )
+    site_revision = op.create_table('site_revision',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('site_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('html_hash', sa.String(length=64), nullable=False),
+    sa.Column('python_hash', sa.String(length=64), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['html_hash'], ['content_blob.hash'], ),
+    sa.ForeignKeyConstraint(['python_hash'], ['content_blob.hash'], ),
+    sa.ForeignKeyConstraint(['site_id'], ['site.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('site_id', 'version')
+    )
+    with op.batch_alter_table('site_revision', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_site_revision_site_id'), ['site_id'], unique=False)
+
+    # Seed each existing site's current content as its first revision.
+    bind = op.get_bind()
+    now = datetime.utcnow()
+    blobs = {}
+    revisions = []
+    sites = bind.execute(sa.text(
+        'SELECT id, version, html_content, python_content FROM site'))
+    for site_id, version, html_content, python_content in sites:
+        hashes = []
+        for text in (html_content, python_content):
+            data = text.encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()
+            if digest not in blobs:
+                blobs[digest] = {'hash': digest, 'data': zlib.compress(data, 6),
+                                 'size': len(data), 'created_at': now}
+            hashes.append(digest)
+        revisions.append({'site_id': site_id, 'version': version,
+                          'html_hash': hashes[0], 'python_hash': hashes[1],
+                          'created_at': now})
+    if blobs:
+        op.bulk_insert(content_blob, list(blobs.values()))
+        op.bulk_insert(site_revision, revisions)
+
+
+def downgrade():
+    with op.batch_alter_table('site_revision', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_site_revision_site_id'))
+
+    op.drop_table('site_revision')
+    op.drop_table('content_blob')
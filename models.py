@@ -37,6 +37,8 @@ class GitHubRepo(db.Model):
     is_private = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_verified_at = db.Column(db.DateTime, nullable=True)
+    verify_status = db.Column(db.String(20), nullable=True)
     site_id = db.Column(db.Integer, db.ForeignKey('site.id'), nullable=False)
     site = db.relationship('Site', backref=db.backref('github_repo', uselist=False))
 
@@ -49,18 +51,99 @@ class Site(db.Model):
     name = db.Column(db.String(80), nullable=False)
     slug = db.Column(db.String(100), unique=True, nullable=False)
     site_type = db.Column(db.String(20), nullable=False, default='web')
-    html_content = db.Column(db.Text, nullable=False, default='<h1>Welcome to my site!</h1>')
-    python_content = db.Column(db.Text, nullable=False, default='print("Hello, World!")')
+    # Content is only loaded when accessed or asked for with ``with_content``.
+    html_content = db.deferred(db.Column(db.Text, nullable=False, default='<h1>Welcome to my site!</h1>'), group='content')
+    python_content = db.deferred(db.Column(db.Text, nullable=False, default='print("Hello, World!")'), group='content')
     is_public = db.Column(db.Boolean, default=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     user = db.relationship('User', backref=db.backref('sites', lazy=True))
+
+    __table_args__ = (db.Index('ix_site_user_updated', 'user_id', 'updated_at', 'id'), )
     
     def __init__(self, *args, **kwargs):
         if 'slug' not in kwargs:
             kwargs['slug'] = slugify(kwargs.get('name', ''))
         super(Site, self).__init__(*args, **kwargs)
+
+    @classmethod
+    def with_content(cls):
+        """Query that loads the deferred content columns up front"""
+        return cls.query.options(db.undefer_group('content'))
+
+    @classmethod
+    def ownership(cls, site_id):
+        """Query for just ``(id, user_id)`` of a site, for permission checks"""
+        return cls.query.with_entities(cls.id, cls.user_id).filter_by(id=site_id)
+
+    @classmethod
+    def listing(cls, user_id):
+        """Query for the columns dashboards show, newest first"""
+        return cls.query.with_entities(
+            cls.id, cls.name, cls.slug, cls.site_type, cls.is_public,
+            cls.version, cls.created_at, cls.updated_at).filter_by(
+                user_id=user_id).order_by(cls.updated_at.desc(), cls.id.desc())
     
     def __repr__(self):
         return f'<Site {self.name}>'
+
+
+class ContentBlob(db.Model):
+    __tablename__ = 'content_blob'
+    hash = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ContentBlob {self.hash[:12]}>'
+
+
+class SiteRevision(db.Model):
+    __tablename__ = 'site_revision'
+    __table_args__ = (db.UniqueConstraint('site_id', 'version'), )
+    id = db.Column(db.Integer, primary_key=True)
+    site_id = db.Column(db.Integer, db.ForeignKey('site.id', ondelete='CASCADE'), nullable=False, index=True)
+    version = db.Column(db.Integer, nullable=False)
+    html_hash = db.Column(db.String(64), db.ForeignKey('content_blob.hash'), nullable=False)
+    python_hash = db.Column(db.String(64), db.ForeignKey('content_blob.hash'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SiteRevision {self.site_id}@{self.version}>'
+
+
+class GitHubJob(db.Model):
+    __tablename__ = 'github_job'
+    # Plain ids: a job's record outlives the site it worked on.
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    site_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    coalesced = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    def __repr__(self):
+        return f'<GitHubJob {self.kind} {self.id}>'
+
+
+class SiteFile(db.Model):
+    __tablename__ = 'site_file'
+    __table_args__ = (db.UniqueConstraint('site_id', 'name'), )
+    id = db.Column(db.Integer, primary_key=True)
+    site_id = db.Column(db.Integer, db.ForeignKey('site.id', ondelete='CASCADE'), nullable=False, index=True)
+    name = db.Column(db.String(255), nullable=False)
+    content = db.deferred(db.Column(db.Text, nullable=False, default=''))
+    content_hash = db.Column(db.String(64), nullable=False)
+    size = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SiteFile {self.site_id}:{self.name}>'
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import make_response, request, session
+from flask_login import current_user
+
+from site_cache import compress_renditions
+
+PAGE_CACHE_RECHECK = float(os.getenv('PAGE_CACHE_RECHECK', '2'))
+
+
+class CachedPage:
+    __slots__ = ('body', 'status', 'mimetype', 'etag', 'encodings')
+
+    def __init__(self, body, status, mimetype):
+        self.body = body
+        self.status = status
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.encodings = compress_renditions(body.decode('utf-8'))
+
+
+class PageCache:
+    """Whole-page cache for views whose output only depends on templates.
+
+    Only anonymous GET requests without query arguments or pending flash
+    messages are cached. Entries are keyed by endpoint and the newest
+    template mtime, which is rechecked at most every ``recheck`` seconds,
+    so a deploy that changes templates invalidates everything. Responses
+    carry an ETag and ``no-cache`` so browsers revalidate and get a 304.
+    """
+
+    def __init__(self, recheck=PAGE_CACHE_RECHECK):
+        self.recheck = recheck
+        self.app = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._mtime = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['page_cache'] = self
+
+    def templates_mtime(self):
+        now = time.monotonic()
+        if self._mtime is None or now - self._checked_at > self.recheck:
+            folder = os.path.join(self.app.root_path,
+                                  self.app.template_folder)
+            mtime = max((entry.stat().st_mtime
+                         for entry in os.scandir(folder) if entry.is_file()),
+                        default=0)
+            with self._lock:
+                if mtime != self._mtime:
+                    self._entries.clear()
+                self._mtime = mtime
+                self._checked_at = now
+        return self._mtime
+
+    def cached(self, view):
+        """Decorator serving ``view`` from the cache for anonymous visitors"""
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if (request.method != 'GET' or request.args
+                    or '_flashes' in session
+                    or current_user.is_authenticated):
+                return view(*args, **kwargs)
+
+            key = (request.endpoint, self.templates_mtime())
+            with self._lock:
+                page = self._entries.get(key)
+                if page is not None:
+                    self.hits += 1
+            if page is None:
+                response = self.app.make_response(view(*args, **kwargs))
+                page = CachedPage(response.get_data(), response.status_code,
+                                  response.mimetype)
+                with self._lock:
+                    self.misses += 1
+                    self._entries[key] = page
+
+            encoding = request.accept_encodings.best_match(page.encodings)
+            if encoding:
+                response = make_response(page.encodings[encoding],
+                                         page.status)
+                response.content_encoding = encoding
+                response.set_etag(f'{page.etag}-{encoding}')
+            else:
+                response = make_response(page.body, page.status)
+                response.set_etag(page.etag)
+            response.mimetype = page.mimetype
+            response.vary.add('Accept-Encoding')
+            response.vary.add('Cookie')
+            response.cache_control.no_cache = True
+            if page.status != 200:
+                return response
+            return response.make_conditional(request)
+
+        return wrapper
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+page_cache = PageCache()
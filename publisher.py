@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+from site_cache import compress_renditions
+
+PUBLISH_DIR = os.getenv(
+    'PUBLISH_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'published'))
+PUBLISH_IMMUTABLE_MAX_AGE = int(
+    os.getenv('PUBLISH_IMMUTABLE_MAX_AGE', '31536000'))
+PUBLISH_MANIFEST_CACHE = int(os.getenv('PUBLISH_MANIFEST_CACHE', '1024'))
+# Site file names cannot start with a dot, so these never collide.
+MANIFEST = '.manifest.json'
+SNAPSHOTS = '.snapshots'
+
+
+def hashed_name(name, digest):
+    """``css/site.css`` -> ``css/site.<digest[:12]>.css``"""
+    head, dot, ext = name.rpartition('.')
+    if not dot or '/' in ext:
+        return f'{name}.{digest[:12]}'
+    return f'{head}.{digest[:12]}.{ext}'
+
+
+def rewrite_references(html, renamed):
+    """Point ``src``/``href`` attributes at the content-hashed asset names"""
+
+    def replace(match):
+        url = match.group(3)
+        target = renamed.get(url[2:] if url.startswith('./') else url)
+        if target is None:
+            return match.group(0)
+        return f'{match.group(1)}={match.group(2)}{target}{match.group(2)}'
+
+    return re.sub(r'''\b(src|href)=(["'])([^"'<>]+)\2''', replace, html)
+
+
+class Publisher:
+    """Writes immutable on-disk snapshots of sites and finds files in them.
+
+    A deploy builds a new snapshot directory holding every file under its
+    own name plus a content-hashed copy, precompressed gzip/brotli variants
+    and a manifest, then atomically repoints the ``<slug>`` symlink at it.
+    Serving a published site only reads the symlink and the (cached)
+    manifest; it never touches the database.
+    """
+
+    def __init__(self, root=PUBLISH_DIR, cache_size=PUBLISH_MANIFEST_CACHE):
+        self.root = root
+        self.cache_size = cache_size
+        self.deploys = 0
+        self._manifests = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _link(self, slug):
+        return os.path.join(self.root, slug)
+
+    def publish(self, slug, files):
+        """Write ``files`` (name -> text) as the live snapshot for ``slug``.
+
+        Returns the snapshot id.
+        """
+        digests = {
+            name: hashlib.sha256(content.encode('utf-8')).hexdigest()
+            for name, content in files.items()
+        }
+        renamed = {
+            name: hashed_name(name, digest)
+            for name, digest in digests.items() if name != 'index.html'
+        }
+        snapshot_id = hashlib.sha256(''.join(
+            f'{name}\0{digests[name]}\0'
+            for name in sorted(files)).encode()).hexdigest()[:16]
+        link = self._link(slug)
+        if os.path.islink(link) and os.path.basename(
+                os.path.realpath(link)).startswith(f'{snapshot_id}-'):
+            return snapshot_id  # already live
+
+        snapshot = os.path.join(self.root, SNAPSHOTS,
+                                f'{snapshot_id}-{uuid.uuid4().hex[:8]}')
+        building = f'{snapshot}.tmp'
+        try:
+            manifest = {}
+            for name, content in files.items():
+                if name == 'index.html':
+                    content = rewrite_references(content, renamed)
+                stored = [name] + ([renamed[name]] if name in renamed else [])
+                body = content.encode('utf-8')
+                variants = compress_renditions(content)
+                for path in stored:
+                    self._write(building, path, body)
+                    for coding, data in variants.items():
+                        self._write(building, f'{path}.{coding}', data)
+                etag = hashlib.sha256(body).hexdigest()[:32]
+                for path in stored:
+                    manifest[path] = {
+                        'etag': etag,
+                        'encodings': sorted(variants),
+                        'immutable': path != name
+                    }
+            self._write(building, MANIFEST, json.dumps(manifest).encode())
+            os.rename(building, snapshot)
+        except OSError:
+            shutil.rmtree(building, ignore_errors=True)
+            raise
+
+        self._swap(link, snapshot)
+        self.deploys += 1
+        return snapshot_id
+
+    def _write(self, directory, path, data):
+        target = os.path.join(directory, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+
+    def _swap(self, link, snapshot):
+        previous = os.path.realpath(link) if os.path.islink(link) else None
+        temporary = f'{link}.tmp-{uuid.uuid4().hex}'
+        os.symlink(os.path.relpath(snapshot, self.root), temporary)
+        os.replace(temporary, link)
+        if previous:
+            shutil.rmtree(previous, ignore_errors=True)
+
+    def rename(self, old_slug, new_slug):
+        """Serve an existing snapshot under a new slug"""
+        old_link = self._link(old_slug)
+        if os.path.islink(old_link):
+            os.replace(old_link, self._link(new_slug))
+
+    def unpublish(self, slug):
+        link = self._link(slug)
+        if os.path.islink(link):
+            snapshot = os.path.realpath(link)
+            os.unlink(link)
+            shutil.rmtree(snapshot, ignore_errors=True)
+
+    def _manifest(self, snapshot):
+        with self._lock:
+            manifest = self._manifests.get(snapshot)
+            if manifest is not None:
+                self._manifests.move_to_end(snapshot)
+                return manifest
+        try:
+            with open(os.path.join(snapshot, MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._manifests[snapshot] = manifest
+            while len(self._manifests) > self.cache_size:
+                self._manifests.popitem(last=False)
+        return manifest
+
+    def lookup(self, slug, name='index.html'):
+        """``(path, entry)`` of a published file, or None if not published"""
+        link = self._link(slug)
+        if '..' in name.split('/') or not os.path.islink(link):
+            return None
+        snapshot = os.path.realpath(link)
+        manifest = self._manifest(snapshot)
+        if manifest is None or name not in manifest:
+            return None
+        return os.path.join(snapshot, name), manifest[name]
+
+    def stats(self):
+        with self._lock:
+            return {'deploys': self.deploys, 'manifests': len(self._manifests)}
+
+
+publisher = Publisher()
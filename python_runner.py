@@ -0,0 +1,446 @@
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Connection
+
+PYTHON_RUN_WORKERS = int(
+    os.getenv('PYTHON_RUN_WORKERS', str(os.cpu_count() or 2)))
+PYTHON_RUN_QUEUE = int(os.getenv('PYTHON_RUN_QUEUE', '16'))
+PYTHON_RUN_QUEUE_TIMEOUT = float(os.getenv('PYTHON_RUN_QUEUE_TIMEOUT', '10'))
+PYTHON_RUN_TIMEOUT = float(os.getenv('PYTHON_RUN_TIMEOUT', '10'))
+PYTHON_RUN_CPU_SECONDS = int(os.getenv('PYTHON_RUN_CPU_SECONDS', '5'))
+PYTHON_RUN_MEMORY_MB = int(os.getenv('PYTHON_RUN_MEMORY_MB', '256'))
+PYTHON_RUN_MAX_OUTPUT = int(os.getenv('PYTHON_RUN_MAX_OUTPUT', '1048576'))
+PYTHON_STREAM_LIVE_LIMIT = int(os.getenv('PYTHON_STREAM_LIVE_LIMIT', '65536'))
+PYTHON_STREAM_TAIL_CHUNKS = int(os.getenv('PYTHON_STREAM_TAIL_CHUNKS', '64'))
+CHUNK_SIZE = 4096
+
+# Modules imported once per worker so user scripts don't pay for them.
+WARM_MODULES = ('collections', 'datetime', 'itertools', 'json', 'math',
+                'random', 're', 'string', 'time', 'traceback')
+
+
+class RunnerBusy(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+
+class _ChannelWriter:
+    """File-like object that forwards a child's output to its worker"""
+
+    def __init__(self, conn, stream, budget):
+        self.conn = conn
+        self.stream = stream
+        self.budget = budget
+        self.buffer = []
+        self.buffered = 0
+
+    def write(self, text):
+        if not isinstance(text, str):
+            raise TypeError(
+                f'write() argument must be str, not {type(text).__name__}')
+        if self.budget['remaining'] <= 0:
+            return len(text)
+        chunk = text[:self.budget['remaining']]
+        self.budget['remaining'] -= len(chunk)
+        self.buffer.append(chunk)
+        self.buffered += len(chunk)
+        if '\n' in chunk or self.buffered >= CHUNK_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            data = ''.join(self.buffer)
+            for start in range(0, len(data), CHUNK_SIZE):
+                self.conn.send((self.stream, data[start:start + CHUNK_SIZE]))
+            self.buffer = []
+            self.buffered = 0
+
+    def isatty(self):
+        return False
+
+
+def _child_main(conn, job):
+    """Run one script inside a freshly forked child and report back"""
+    import traceback
+
+    try:
+        import resource
+        cpu = job['cpu_seconds']
+        memory = job['memory_mb'] * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    except BaseException as e:
+        # Never run unconfined, and never fall back into the worker loop.
+        try:
+            conn.send(('exit', {
+                'ok': False,
+                'error': f'Could not set resource limits: {e}'
+            }))
+        finally:
+            os._exit(1)
+
+    budget = {'remaining': job['max_output']}
+    sys.stdout = _ChannelWriter(conn, 'stdout', budget)
+    sys.stderr = _ChannelWriter(conn, 'stderr', budget)
+    status = {'ok': True, 'error': None}
+    try:
+        exec(job['code'], {})
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            status = {'ok': False, 'error': f'SystemExit: {e.code}'}
+    except BaseException as e:
+        status = {'ok': False, 'error': str(e) or type(e).__name__}
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        status['truncated'] = budget['remaining'] <= 0
+        conn.send(('exit', status))
+    finally:
+        os._exit(0)
+
+
+def _describe_exit(wait_status):
+    if os.WIFSIGNALED(wait_status):
+        sig = os.WTERMSIG(wait_status)
+        if sig == signal.SIGXCPU:
+            return 'CPU time limit exceeded'
+        return f'Process killed by {signal.Signals(sig).name}'
+    return f'Process exited with status {os.WEXITSTATUS(wait_status)}'
+
+
+def _kill_group(pgid):
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _set_send_timeout(sock, seconds):
+    """Make blocking sends on ``sock`` give up after ``seconds``; 0 never"""
+    whole = int(seconds)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO,
+                    struct.pack('ll', whole, int((seconds - whole) * 1e6)))
+
+
+def _run_job(conn, control, job):
+    """Fork a child for ``job`` and relay its output until it finishes.
+
+    Relaying stops at the job's deadline even if the web process has stopped
+    reading: sends time out then. Returns False when that left the
+    connection unusable and the worker has to exit.
+    """
+    reader, writer = multiprocessing.Pipe(duplex=False)
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            # Own process group, so the job and anything it forks can be
+            # killed together.
+            os.setpgid(0, 0)
+            reader.close()
+            conn.close()
+            control.close()
+            _child_main(writer, job)
+        finally:
+            os._exit(1)
+    try:
+        os.setpgid(pid, pid)
+    except OSError:
+        pass  # the child already did it (or has exited)
+    writer.close()
+    conn.send(('started', pid))
+
+    deadline = started + job['timeout']
+    status = None
+    timed_out = False
+    stalled = False
+    try:
+        while status is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            if not reader.poll(remaining):
+                continue
+            try:
+                message = reader.recv()
+            except EOFError:
+                break
+            if message[0] == 'exit':
+                status = message[1]
+                continue
+            _set_send_timeout(control, max(deadline - time.monotonic(),
+                                           0.001))
+            try:
+                conn.send(message)
+            except BlockingIOError:
+                # Nobody is reading; the message may be half written.
+                timed_out = stalled = True
+                break
+    finally:
+        _set_send_timeout(control, 0)
+        reader.close()
+
+    if timed_out:
+        _kill_group(pid)
+    _, wait_status = os.waitpid(pid, 0)
+    _kill_group(pid)  # processes the script left behind
+    if stalled:
+        return False
+    if timed_out:
+        status = {
+            'ok': False,
+            'error': f'Execution timed out after {job["timeout"]:g}s',
+            'timed_out': True
+        }
+    elif status is None:
+        status = {'ok': False, 'error': _describe_exit(wait_status)}
+    status['duration'] = time.monotonic() - started
+    conn.send(('exit', status))
+    return True
+
+
+def _worker_main(conn):
+    """Long-lived pre-warmed interpreter that forks one child per job"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for name in WARM_MODULES:
+        __import__(name)
+    # A second handle on the connection's socket, for setting options.
+    control = socket.socket(fileno=os.dup(conn.fileno()))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None or not _run_job(conn, control, job):
+            break
+
+
+class _Worker:
+    """A pre-warmed interpreter connected to the web process by a socket"""
+
+    def __init__(self):
+        parent_sock, child_sock = socket.socketpair()
+        self.process = subprocess.Popen(
+            [sys.executable, __file__,
+             str(child_sock.fileno())],
+            pass_fds=(child_sock.fileno(), ),
+            stdin=subprocess.DEVNULL)
+        child_sock.close()
+        self.conn = Connection(parent_sock.detach())
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        self.conn.close()
+        self.process.kill()
+        self.process.wait()
+
+
+class RunJob:
+    """A script running on a pool worker.
+
+    Iterating yields ``(stream, text)`` events followed by a final
+    ``('exit', status)``. The worker is returned to the pool once the exit
+    event has been read or the job is closed. A job closed before it
+    finished has its whole process group killed along with the worker.
+    """
+
+    def __init__(self, runner, worker, job):
+        self.runner = runner
+        self.worker = worker
+        self.job = job
+        self.status = None
+        self.broken = False
+        self.pgid = None
+        worker.conn.send(job)
+
+    def __iter__(self):
+        grace = self.job['timeout'] + 5
+        try:
+            while self.status is None:
+                if not self.worker.conn.poll(grace):
+                    raise TimeoutError('Python worker stopped responding')
+                event = self.worker.conn.recv()
+                if event[0] == 'started':
+                    self.pgid = event[1]
+                    continue
+                if event[0] == 'exit':
+                    self.status = event[1]
+                yield event
+        except (EOFError, OSError, TimeoutError) as e:
+            self.broken = True
+            self.status = {'ok': False, 'error': f'Runner failure: {e}'}
+            yield 'exit', self.status
+        finally:
+            self.close()
+
+    def close(self):
+        if self.worker is None:
+            return
+        worker, self.worker = self.worker, None
+        healthy = self.status is not None and not self.broken
+        if not healthy and self.pgid is not None:
+            _kill_group(self.pgid)
+        self.runner._release(worker, healthy=healthy)
+
+    def result(self):
+        """Wait for the job to finish and collect its output"""
+        output = {'stdout': [], 'stderr': []}
+        for stream, payload in self:
+            if stream != 'exit':
+                output[stream].append(payload)
+        return dict(self.status,
+                    stdout=''.join(output['stdout']),
+                    stderr=''.join(output['stderr']))
+
+
+class OutputRing:
+    """Caps the output forwarded to a streaming client.
+
+    The first ``live_limit`` characters are passed straight through. After
+    that only the most recent ``tail_chunks`` chunks are kept, and they are
+    released by ``drain`` once the script has finished.
+    """
+
+    def __init__(self,
+                 live_limit=PYTHON_STREAM_LIVE_LIMIT,
+                 tail_chunks=PYTHON_STREAM_TAIL_CHUNKS):
+        self.live_limit = live_limit
+        self.sent = 0
+        self.dropped = 0
+        self.overflowed = False
+        self.tail = deque(maxlen=tail_chunks)
+
+    def accept(self, stream, text):
+        """Return True if the chunk should be forwarded immediately"""
+        # Once a chunk has gone to the ring, everything after it must too,
+        # or a later small chunk would overtake it.
+        if not self.overflowed and self.sent + len(text) <= self.live_limit:
+            self.sent += len(text)
+            return True
+        self.overflowed = True
+        if len(self.tail) == self.tail.maxlen:
+            self.dropped += len(self.tail[0][1])
+        self.tail.append((stream, text))
+        return False
+
+    def drain(self):
+        tail = list(self.tail)
+        self.tail.clear()
+        return tail
+
+
+class PythonRunner:
+    """Pool of pre-forked worker processes that execute user scripts.
+
+    Each run happens in a child forked from a warm worker with its own
+    stdout/stderr, CPU and memory rlimits and a wall-clock timeout. At most
+    ``queue_size`` jobs wait for a free worker; beyond that ``submit``
+    raises ``RunnerBusy`` so web workers are never tied up indefinitely.
+    """
+
+    def __init__(self,
+                 workers=PYTHON_RUN_WORKERS,
+                 queue_size=PYTHON_RUN_QUEUE,
+                 queue_timeout=PYTHON_RUN_QUEUE_TIMEOUT,
+                 timeout=PYTHON_RUN_TIMEOUT,
+                 cpu_seconds=PYTHON_RUN_CPU_SECONDS,
+                 memory_mb=PYTHON_RUN_MEMORY_MB,
+                 max_output=PYTHON_RUN_MAX_OUTPUT):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_output = max_output
+        self.runs = 0
+        self.rejected = 0
+        self.replaced = 0
+        self._idle = queue.Queue()
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.workers):
+                self._idle.put(_Worker())
+            self._started = True
+
+    def shutdown(self):
+        with self._lock:
+            while True:
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                worker.kill()
+            self._started = False
+
+    def submit(self, code, timeout=None):
+        """Reserve a worker and start running ``code`` on it"""
+        if not self._started:
+            self.start()
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise RunnerBusy('Too many scripts are waiting to run')
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            self._slots.release()
+            self.rejected += 1
+            raise RunnerBusy('Timed out waiting for a free worker')
+        self.runs += 1
+        job = {
+            'code': code,
+            'timeout': min(timeout or self.timeout, self.timeout),
+            'cpu_seconds': self.cpu_seconds,
+            'memory_mb': self.memory_mb,
+            'max_output': self.max_output
+        }
+        try:
+            return RunJob(self, worker, job)
+        except Exception:
+            self._release(worker, healthy=False)
+            raise
+
+    def run(self, code, timeout=None):
+        return self.submit(code, timeout).result()
+
+    def _release(self, worker, healthy):
+        if not healthy or not worker.alive():
+            worker.kill()
+            worker = _Worker()
+            self.replaced += 1
+        self._idle.put(worker)
+        self._slots.release()
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'idle': self._idle.qsize(),
+            'runs': self.runs,
+            'rejected': self.rejected,
+            'replaced': self.replaced
+        }
+
+
+runner = PythonRunner()
+
+
+if __name__ == '__main__':
+    _worker_main(Connection(int(sys.argv[1])))
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+from query_timing import query_timing
+
+QUERY_PROFILE = os.getenv('QUERY_PROFILE', 'false').lower() == 'true'
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '5'))
+QUERY_TIMELINE_FILE = os.getenv('QUERY_TIMELINE_FILE')
+QUERY_PARAMS_MAX = 200
+
+
+def _params(parameters):
+    text = repr(parameters)
+    if len(text) > QUERY_PARAMS_MAX:
+        text = text[:QUERY_PARAMS_MAX] + '...'
+    return text
+
+
+class QueryProfiler:
+    """Opt-in SQL profiling built on the shared ``query_timing`` hook.
+
+    When enabled (``QUERY_PROFILE=true``) it logs every statement slower
+    than ``SLOW_QUERY_MS`` with its parameters and endpoint, and warns when
+    one request runs the same statement ``N_PLUS_ONE_THRESHOLD`` or more
+    times, which usually means a query in a loop. With
+    ``QUERY_TIMELINE_FILE`` set, each request's statements are appended to
+    that file as one JSON line.
+    """
+
+    def __init__(self,
+                 enabled=QUERY_PROFILE,
+                 slow_ms=SLOW_QUERY_MS,
+                 repeat_threshold=N_PLUS_ONE_THRESHOLD,
+                 timeline_file=QUERY_TIMELINE_FILE):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.repeat_threshold = repeat_threshold
+        self.timeline_file = timeline_file
+        self.app = None
+        self.slow_queries = 0
+        self.repeated = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['query_profiler'] = self
+        if not self.enabled:
+            return
+        app.before_request(self._start)
+        app.teardown_request(self._finish)
+        query_timing.subscribe(self._record_query)
+
+    def _start(self):
+        g.profile_started = time.perf_counter()
+        g.profile_queries = []
+
+    def _record_query(self, statement, parameters, executemany, started,
+                      elapsed):
+        elapsed_ms = elapsed * 1000
+        endpoint = None
+        queries = None
+        if has_request_context():
+            endpoint = request.endpoint
+            queries = g.get('profile_queries')
+
+        if elapsed_ms >= self.slow_ms:
+            with self._lock:
+                self.slow_queries += 1
+            self.app.logger.warning(
+                f'Slow query ({elapsed_ms:.1f}ms) in '
+                f'{endpoint or "background"}: {statement} '
+                f'params={_params(parameters)}')
+        if queries is not None:
+            queries.append({
+                'start_ms': round((started - g.profile_started) * 1000, 3),
+                'duration_ms': round(elapsed_ms, 3),
+                'statement': statement,
+                'params': _params(parameters),
+                'executemany': executemany
+            })
+
+    def _finish(self, exc):
+        queries = g.pop('profile_queries', None)
+        started = g.pop('profile_started', None)
+        if queries is None:
+            return
+        endpoint = request.endpoint
+
+        counts = {}
+        for query in queries:
+            counts[query['statement']] = counts.get(query['statement'], 0) + 1
+        repeated = {
+            statement: count
+            for statement, count in counts.items()
+            if count >= self.repeat_threshold
+        }
+        for statement, count in repeated.items():
+            self.app.logger.warning(
+                f'Possible N+1 in {endpoint}: {count} runs of {statement}')
+        if repeated:
+            with self._lock:
+                self.repeated += 1
+
+        if self.timeline_file and queries:
+            line = json.dumps({
+                'endpoint': endpoint,
+                'method': request.method,
+                'path': request.path,
+                'at': time.time(),
+                'duration_ms': round(
+                    (time.perf_counter() - started) * 1000, 3),
+                'repeated': repeated,
+                'queries': queries
+            })
+            with self._lock:
+                with open(self.timeline_file, 'a') as f:
+                    f.write(line + '\n')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'slow_queries': self.slow_queries,
+                'repeated_requests': self.repeated
+            }
+
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,52 @@
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryTiming:
+    """Times every SQL statement once, for everything that wants timings.
+
+    One pair of engine cursor listeners keeps a start-time stack in
+    ``conn.info``; subscribers are called after each successful statement
+    with ``(statement, parameters, executemany, started, elapsed)``, where
+    ``started`` is a ``time.perf_counter()`` reading. A statement that
+    raises is popped in ``handle_error`` and not reported.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+        self._installed = False
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers = self._subscribers + [callback]
+            if not self._installed:
+                event.listen(Engine, 'before_cursor_execute', self._before)
+                event.listen(Engine, 'after_cursor_execute', self._after)
+                event.listen(Engine, 'handle_error', self._error)
+                self._installed = True
+
+    def _before(self, conn, cursor, statement, parameters, context,
+                executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context,
+               executemany):
+        finished = time.perf_counter()
+        started = conn.info['query_started'].pop()
+        for callback in self._subscribers:
+            callback(statement, parameters, executemany, started,
+                     finished - started)
+
+    def _error(self, context):
+        if context.connection is not None:
+            started = context.connection.info.get('query_started')
+            if started:
+                started.pop()
+
+
+query_timing = QueryTiming()
@@ -0,0 +1,99 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+RUN_CACHE_SIZE = int(os.getenv('RUN_CACHE_SIZE', '256'))
+RUN_CACHE_TTL = float(os.getenv('RUN_CACHE_TTL', '3600'))
+RUN_CACHE_MAX_ENTRY = int(os.getenv('RUN_CACHE_MAX_ENTRY', '65536'))
+RUN_CACHE_MAX_BYTES = int(os.getenv('RUN_CACHE_MAX_BYTES', '16777216'))
+
+
+def code_key(code):
+    """Hash of the submitted code and the interpreter that will run it"""
+    digest = hashlib.sha256()
+    digest.update(sys.version.encode())
+    digest.update(b'\0')
+    digest.update(code.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cacheable(result):
+    """Only results the script itself produced are worth replaying"""
+    if result.get('timed_out') or result.get('truncated'):
+        return False
+    return not (result.get('error') or '').startswith('Runner failure')
+
+
+class ResultCache:
+    """LRU + TTL cache of script results for code marked deterministic.
+
+    Entries larger than ``max_entry`` characters of output are never stored
+    and the total cached output is kept under ``max_bytes``.
+    """
+
+    def __init__(self,
+                 maxsize=RUN_CACHE_SIZE,
+                 ttl=RUN_CACHE_TTL,
+                 max_entry=RUN_CACHE_MAX_ENTRY,
+                 max_bytes=RUN_CACHE_MAX_BYTES):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_entry = max_entry
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(result):
+        return len(result.get('stdout', '')) + len(result.get('stderr', ''))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._evict(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, result):
+        size = self._size(result)
+        if size > self.max_entry:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self.total_bytes += size
+            while (len(self._entries) > self.maxsize
+                   or self.total_bytes > self.max_bytes):
+                self._evict(next(iter(self._entries)))
+        return True
+
+    def _evict(self, key):
+        _, result = self._entries.pop(key)
+        self.total_bytes -= self._size(result)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None
+            }
+
+
+result_cache = ResultCache()
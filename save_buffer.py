@@ -0,0 +1,259 @@
+import atexit
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from content_store import content_store
+from models import db, Site
+
+SAVE_BUFFER_INTERVAL = float(os.getenv('SAVE_BUFFER_INTERVAL', '0'))
+SAVE_BUFFER_MAX_SITES = int(os.getenv('SAVE_BUFFER_MAX_SITES', '1000'))
+SAVE_BUFFER_MAX_BYTES = int(os.getenv('SAVE_BUFFER_MAX_BYTES', '33554432'))
+
+
+def _size(entry):
+    return len(entry['html_content'] or '') + len(entry['python_content'] or '')
+
+
+class SaveBuffer:
+    """Write-behind buffer for editor saves.
+
+    ``stage`` accepts a save in memory and assigns it the next version; only
+    the latest staged content of each site is written, every ``interval``
+    seconds, in one transaction for all buffered sites. Sites are also
+    flushed when their owner logs out and when the process exits. Once the
+    buffer holds ``max_sites`` sites or ``max_bytes`` of content the saving
+    request flushes inline. Readers must go through ``overlay`` to see staged
+    content. Each flush records one revision per site, so history keeps
+    the flushed versions rather than every keystroke save. The buffer is
+    per process, so it assumes a single app process. It is off unless
+    ``SAVE_BUFFER_INTERVAL`` is above zero; saves are then written
+    straight through.
+    """
+
+    def __init__(self,
+                 interval=SAVE_BUFFER_INTERVAL,
+                 max_sites=SAVE_BUFFER_MAX_SITES,
+                 max_bytes=SAVE_BUFFER_MAX_BYTES):
+        self.interval = interval
+        self.max_sites = max_sites
+        self.max_bytes = max_bytes
+        self.app = None
+        self.staged = 0
+        self.flushes = 0
+        self.flushed_sites = 0
+        self.flush_failures = 0
+        self.total_bytes = 0
+        self._pending = {}
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['save_buffer'] = self
+        if not self.enabled:
+            return
+        app.before_request(self.ensure_started)
+        atexit.register(self._flush_on_exit)
+        if (threading.current_thread() is threading.main_thread()
+                and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL):
+            # Turn SIGTERM into a normal exit so the atexit flush runs.
+            signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run,
+                                            name='save-buffer',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                self.app.logger.error(f'Save buffer flush failed: {e}')
+
+    def _flush_on_exit(self):
+        self.stop()
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception as e:
+            self.app.logger.error(f'Save buffer flush on exit failed: {e}')
+
+    def _entry(self, site_id):
+        return self._pending.get(site_id) or self._flushing.get(site_id)
+
+    def version(self, site_id, stored):
+        """The staged version of a site, or ``stored`` if none is staged"""
+        with self._lock:
+            entry = self._entry(site_id)
+        return entry['version'] if entry is not None else stored
+
+    def overlay(self, site):
+        """Apply any staged content to ``site`` without marking it dirty"""
+        with self._lock:
+            entry = self._entry(site.id)
+        if entry is not None:
+            for key in ('html_content', 'python_content', 'version',
+                        'updated_at'):
+                set_committed_value(site, key, entry[key])
+        return site
+
+    def overlay_rows(self, rows):
+        """``Site.listing`` rows with staged ``version``/``updated_at``"""
+        if not self.enabled:
+            return rows
+        with self._lock:
+            entries = {row.id: self._entry(row.id) for row in rows}
+        return [
+            row if entries[row.id] is None else SimpleNamespace(
+                **dict(row._mapping,
+                       version=entries[row.id]['version'],
+                       updated_at=entries[row.id]['updated_at']))
+            for row in rows
+        ]
+
+    def stage(self, site, base_version, html_content=None,
+              python_content=None):
+        """Buffer a save; returns the new version, or None on a conflict.
+
+        ``site`` must already be overlaid. ``base_version`` of None skips
+        the version check.
+        """
+        with self._lock:
+            entry = self._entry(site.id)
+            current = entry['version'] if entry else site.version
+            if base_version is not None and base_version != current:
+                return None
+            previous = self._pending.get(site.id)
+            entry = {
+                'id': site.id,
+                'user_id': site.user_id,
+                'html_content': html_content
+                if html_content is not None else site.html_content,
+                'python_content': python_content
+                if python_content is not None else site.python_content,
+                'version': current + 1,
+                'updated_at': datetime.utcnow()
+            }
+            if previous is not None:
+                self.total_bytes -= _size(previous)
+            self._pending[site.id] = entry
+            self.total_bytes += _size(entry)
+            self.staged += 1
+            full = (len(self._pending) > self.max_sites
+                    or self.total_bytes > self.max_bytes)
+        self.overlay(site)
+        if full:
+            self.flush()
+        return entry['version']
+
+    def discard(self, site_id):
+        """Drop staged content for a deleted site"""
+        with self._lock:
+            entry = self._pending.pop(site_id, None)
+            if entry is not None:
+                self.total_bytes -= _size(entry)
+
+    def flush(self, user_id=None):
+        """Write staged saves (optionally one user's) in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                site_ids = [
+                    site_id for site_id, entry in self._pending.items()
+                    if user_id is None or entry['user_id'] == user_id
+                ]
+                for site_id in site_ids:
+                    entry = self._pending.pop(site_id)
+                    self.total_bytes -= _size(entry)
+                    self._flushing[site_id] = entry
+            if not site_ids:
+                return 0
+
+            started = time.perf_counter()
+            table = Site.__table__
+            statement = (update(table).where(
+                table.c.id == bindparam('b_id'),
+                table.c.version < bindparam('b_version')).values(
+                    html_content=bindparam('b_html_content'),
+                    python_content=bindparam('b_python_content'),
+                    version=bindparam('b_version'),
+                    updated_at=bindparam('b_updated_at')))
+            rows = [{
+                'b_' + key: value
+                for key, value in entry.items() if key != 'user_id'
+            } for entry in self._flushing.values()]
+            try:
+                db.session.connection().execute(statement, rows)
+                # Sites deleted (or written elsewhere) meanwhile get no
+                # revision.
+                written = {
+                    tuple(row)
+                    for row in db.session.query(Site.id, Site.version).filter(
+                        Site.id.in_(list(self._flushing)))
+                }
+                for entry in self._flushing.values():
+                    if (entry['id'], entry['version']) not in written:
+                        continue
+                    content_store.record_revision(entry['id'],
+                                                  entry['version'],
+                                                  entry['html_content'],
+                                                  entry['python_content'])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    self.flush_failures += 1
+                    for site_id, entry in self._flushing.items():
+                        if site_id not in self._pending:
+                            self._pending[site_id] = entry
+                            self.total_bytes += _size(entry)
+                    self._flushing.clear()
+                raise
+            with self._lock:
+                self._flushing.clear()
+                self.flushes += 1
+                self.flushed_sites += len(rows)
+            self.app.logger.debug(
+                f'Flushed {len(rows)} buffered saves in '
+                f'{(time.perf_counter() - started) * 1000:.1f}ms')
+            return len(rows)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'pending': len(self._pending),
+                'bytes': self.total_bytes,
+                'staged': self.staged,
+                'flushes': self.flushes,
+                'flushed_sites': self.flushed_sites,
+                'flush_failures': self.flush_failures
+            }
+
+
+save_buffer = SaveBuffer()
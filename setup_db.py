@@ -1,6 +1,25 @@
+import argparse
+import csv
+import io
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+
 from app import app, db
-from models import User, Site
+from content_store import content_hash, content_store
+from models import User, Site, GitHubRepo, ContentBlob, SiteRevision
+from sqlalchemy import func, insert, select, text
 from sqlalchemy.exc import OperationalError, ProgrammingError, IntegrityError
+from werkzeug.security import generate_password_hash
+
+# Every synthetic user logs in with this password.
+SYNTHETIC_PASSWORD = 'synthetic123'
+SYNTHETIC_EPOCH = datetime(2024, 1, 1)
+
+PARAGRAPH = ('<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed '
+             'do eiusmod tempor incididunt ut labore et dolore magna.</p>\n')
+PYTHON_LINE = 'print("Hello from line {}")\n'
 
 
 def setup_database():
@@ -94,5 +113,245 @@ def setup_database():
         print(f"❌ Database setup failed: {str(e)}")
 
 
+def _timestamp(rng):
+    return SYNTHETIC_EPOCH + timedelta(seconds=rng.randrange(365 * 86400))
+
+
+def site_size(rng, median):
+    """Log-normal sizes: most sites are small, a few are very large"""
+    return min(int(rng.lognormvariate(0, 1) * median), 200 * median)
+
+
+def site_html(size):
+    """Site HTML of roughly ``size`` bytes"""
+    return ('<h1>Welcome to my site!</h1>\n' +
+            PARAGRAPH * (size // len(PARAGRAPH)))
+
+
+def _user_rows(rng, tag, first_id, count, password_hash):
+    for n in range(count):
+        created_at = _timestamp(rng)
+        yield {
+            'id': first_id + n,
+            'username': f'{tag}u{n}',
+            'email': f'{tag}u{n}@example.com',
+            'password_hash': password_hash,
+            'is_active': True,
+            'preview_code_verified': True,
+            'created_at': created_at,
+            'last_login': created_at
+        }
+
+
+def _site_rows(rng, tag, first_id, count, first_user_id, users,
+               content_size):
+    for n in range(count):
+        # Cubing skews ownership towards a minority of very active users.
+        owner = first_user_id + int(users * rng.random()**3)
+        python = rng.random() < 0.2
+        size = site_size(rng, content_size)
+        created_at = _timestamp(rng)
+        yield {
+            'id': first_id + n,
+            'name': f'Site {n}',
+            'slug': f'{tag}-site-{n}',
+            'site_type': 'python' if python else 'web',
+            'html_content': site_html(0 if python else size),
+            'python_content': ''.join(
+                PYTHON_LINE.format(i)
+                for i in range(max(1, size // 32 if python else 1))),
+            'is_public': rng.random() < 0.9,
+            'version': 1,
+            'created_at': created_at,
+            'updated_at': created_at + timedelta(
+                seconds=rng.randrange(30 * 86400)),
+            'user_id': owner
+        }
+
+
+def _repo_rows(rng, tag, first_id, site_ids):
+    for n, site_id in enumerate(site_ids):
+        created_at = _timestamp(rng)
+        yield {
+            'id': first_id + n,
+            'repo_name': f'{tag}/site-{site_id}',
+            'repo_url': f'https://github.com/{tag}/site-{site_id}',
+            'is_private': rng.random() < 0.3,
+            'created_at': created_at,
+            'updated_at': created_at,
+            'site_id': site_id
+        }
+
+
+def _site_contents(first_id, count, batch_size):
+    """(id, created_at, html hash, html, python hash, python) per site"""
+    for start in range(first_id, first_id + count, batch_size):
+        # Fetched whole, since the caller commits between batches.
+        rows = db.session.execute(
+            select(Site.id, Site.created_at, Site.html_content,
+                   Site.python_content).where(
+                       Site.id >= start,
+                       Site.id < min(start + batch_size,
+                                     first_id + count))).all()
+        for site_id, created_at, html, python in rows:
+            yield (site_id, created_at, content_hash(html), html,
+                   content_hash(python), python)
+
+
+def _blob_rows(first_id, count, batch_size):
+    """One row per distinct text not already in ``content_blob``"""
+    seen = set()
+    for batch in _batches(_site_contents(first_id, count, batch_size),
+                          batch_size):
+        texts = {}
+        for _, created_at, html_hash, html, python_hash, python in batch:
+            for h, text in ((html_hash, html), (python_hash, python)):
+                if h not in seen and h not in texts:
+                    texts[h] = (text, created_at)
+        seen.update(texts)
+        existing = set(
+            db.session.scalars(
+                select(ContentBlob.hash).where(
+                    ContentBlob.hash.in_(list(texts)))))
+        for h, (text, created_at) in texts.items():
+            if h in existing:
+                continue
+            data = text.encode('utf-8')
+            yield {
+                'hash': h,
+                'data': zlib.compress(data, content_store.level),
+                'size': len(data),
+                'created_at': created_at
+            }
+
+
+def _revision_rows(first_id, count, batch_size):
+    for site_id, created_at, html_hash, _, python_hash, _ in _site_contents(
+            first_id, count, batch_size):
+        yield {
+            'site_id': site_id,
+            'version': 1,
+            'html_hash': html_hash,
+            'python_hash': python_hash,
+            'created_at': created_at
+        }
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy(table, batch):
+    """Load one batch with PostgreSQL's COPY"""
+    columns = list(batch[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow(r'\N' if row[c] is None else
+                        '\\x' + row[c].hex() if isinstance(row[c], bytes)
+                        else row[c] for c in columns)
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        f'COPY "{table.__tablename__}" ({", ".join(columns)}) '
+        "FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+
+
+def _bulk_load(model, rows, batch_size):
+    postgres = db.engine.dialect.name == 'postgresql'
+    loaded = 0
+    started = time.monotonic()
+    for batch in _batches(rows, batch_size):
+        if postgres:
+            _copy(model, batch)
+        else:
+            db.session.execute(insert(model), batch)
+        db.session.commit()
+        loaded += len(batch)
+    if postgres and 'id' in model.__table__.c:
+        table = model.__tablename__
+        db.session.execute(
+            text(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                 f'(SELECT MAX(id) FROM "{table}"))'))
+        db.session.commit()
+    print(f"✅ Loaded {loaded} {model.__tablename__} rows in "
+          f"{time.monotonic() - started:.1f}s")
+
+
+def load_synthetic(users, sites, repos, seed=1, batch_size=5000,
+                   content_size=2048):
+    """Bulk-load a reproducible synthetic dataset.
+
+    The same ``seed`` always produces the same users, sites and repos
+    (names, sizes, owners, timestamps), and each site gets the revision row
+    and content blobs of its version 1. Rows are written in batches with
+    COPY on PostgreSQL and multi-row INSERTs elsewhere, bypassing the ORM.
+    Returns the id ranges that were used.
+    """
+    tag = f's{seed}'
+    rng = random.Random(seed)
+    with app.app_context():
+        db.create_all()
+        if User.query.filter_by(username=f'{tag}u0').first():
+            raise ValueError(f'Synthetic data for seed {seed} already exists')
+
+        first_user = (db.session.scalar(select(func.max(User.id))) or 0) + 1
+        first_site = (db.session.scalar(select(func.max(Site.id))) or 0) + 1
+        first_repo = (db.session.scalar(select(func.max(GitHubRepo.id)))
+                      or 0) + 1
+        # Hashing is deliberately slow, so every user shares one hash.
+        password_hash = generate_password_hash(SYNTHETIC_PASSWORD)
+
+        _bulk_load(User,
+                   _user_rows(rng, tag, first_user, users, password_hash),
+                   batch_size)
+        _bulk_load(Site,
+                   _site_rows(rng, tag, first_site, sites, first_user,
+                              users, content_size), batch_size)
+        # Every site starts at version 1, which needs its revision row.
+        _bulk_load(ContentBlob, _blob_rows(first_site, sites, batch_size),
+                   batch_size)
+        _bulk_load(SiteRevision,
+                   _revision_rows(first_site, sites, batch_size), batch_size)
+        repo_sites = sorted(
+            rng.sample(range(first_site, first_site + sites),
+                       min(repos, sites)))
+        _bulk_load(GitHubRepo, _repo_rows(rng, tag, first_repo, repo_sites),
+                   batch_size)
+    return {
+        'users': (first_user, first_user + users - 1),
+        'sites': (first_site, first_site + sites - 1),
+        'repos': len(repo_sites)
+    }
+
+
 if __name__ == '__main__':
-    setup_database()
+    parser = argparse.ArgumentParser(description='Set up the database')
+    parser.add_argument('--synthetic',
+                        action='store_true',
+                        help='Bulk-load a synthetic dataset')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--sites', type=int, default=1000000)
+    parser.add_argument('--repos', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--content-size',
+                        type=int,
+                        default=2048,
+                        help='Median site content size in bytes')
+    args = parser.parse_args()
+    if args.synthetic:
+        try:
+            load_synthetic(args.users, args.sites, args.repos, args.seed,
+                           args.batch_size, args.content_size)
+        except ValueError as e:
+            print(f"❌ {str(e)}")
+    else:
+        setup_database()
@@ -0,0 +1,185 @@
+import gzip
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+from content_store import content_hash
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SITE_CACHE_SIZE = int(os.getenv('SITE_CACHE_SIZE', '512'))
+SITE_CACHE_MAX_AGE = int(os.getenv('SITE_CACHE_MAX_AGE', '60'))
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '256'))
+# Used while a request waits; the background pass then redoes it at max.
+COMPRESS_FAST_BROTLI_QUALITY = int(
+    os.getenv('COMPRESS_FAST_BROTLI_QUALITY', '5'))
+COMPRESS_FAST_GZIP_LEVEL = int(os.getenv('COMPRESS_FAST_GZIP_LEVEL', '6'))
+
+
+class CachedSite:
+    """A rendered public site ready to be served without a DB query"""
+
+    __slots__ = ('site_id', 'slug', 'version', 'body', 'etag', 'encodings',
+                 'optimized')
+
+    def __init__(self, site_id, slug, version, body, etag, encodings=None,
+                 optimized=True):
+        self.site_id = site_id
+        self.slug = slug
+        self.version = version
+        self.body = body
+        self.etag = etag
+        self.encodings = encodings or {}
+        self.optimized = optimized
+
+    def encoding_etag(self, encoding):
+        """ETag of one compressed rendition; differs per compression pass"""
+        return f"{self.etag}-{encoding}{'' if self.optimized else '-fast'}"
+
+
+def site_etag(content, version):
+    """Strong ETag from the revision store's content hash and the version"""
+    return f'{content_hash(content)[:32]}.{version}'
+
+
+def compress_renditions(body, fast=False):
+    """Build the precompressed variants worth sending for ``body``.
+
+    Returns a dict of content-coding to bytes, only keeping a variant when it
+    is actually smaller than the identity encoding. ``fast`` trades size for
+    speed, for compression a request has to wait for.
+    """
+    data = body.encode('utf-8')
+    if len(data) < COMPRESS_MIN_SIZE:
+        return {}
+    renditions = {}
+    if brotli is not None:
+        renditions['br'] = brotli.compress(
+            data,
+            mode=brotli.MODE_TEXT,
+            quality=COMPRESS_FAST_BROTLI_QUALITY if fast else 11)
+    renditions['gzip'] = gzip.compress(
+        data,
+        compresslevel=COMPRESS_FAST_GZIP_LEVEL if fast else 9,
+        mtime=0)
+    return {
+        coding: compressed
+        for coding, compressed in renditions.items()
+        if len(compressed) < len(data)
+    }
+
+
+class SiteCache:
+    """In-process LRU of public sites keyed by slug.
+
+    Only public sites are ever stored, so a hit can be served to anyone.
+    Writers call ``put`` after saving so the compressed renditions are built
+    once per edit, and ``invalidate`` with every other slug a change affects.
+    ``put`` compresses quickly; a background thread then swaps in
+    max-quality renditions, skipping entries replaced in the meantime.
+    Invalidation only reaches this process, so readers pass the current
+    ``site_id`` and ``version`` for the slug to ``get``; an entry cached for
+    another site (slugs are reused after renames and deletes) or at another
+    version is dropped and counted as stale.
+    """
+
+    def __init__(self, maxsize=SITE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.optimized = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._to_optimize = queue.Queue(maxsize)
+        self._thread = None
+
+    def get(self, slug, site_id, version):
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry is not None and (entry.site_id != site_id
+                                      or entry.version != version):
+                del self._entries[slug]
+                self.stale += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(slug)
+            self.hits += 1
+            return entry
+
+    def put(self, site):
+        """Cache a site if it may be shared; returns the entry or None"""
+        if not site.is_public:
+            self.invalidate(site.slug)
+            return None
+        encodings = compress_renditions(site.html_content, fast=True)
+        entry = CachedSite(site.id,
+                           site.slug,
+                           site.version,
+                           site.html_content,
+                           site_etag(site.html_content, site.version),
+                           encodings,
+                           optimized=not encodings)
+        with self._lock:
+            self._entries[site.slug] = entry
+            self._entries.move_to_end(site.slug)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        if not entry.optimized:
+            self._schedule(entry)
+        return entry
+
+    def _schedule(self, entry):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._optimize_loop,
+                                                    name='site-compress',
+                                                    daemon=True)
+                    self._thread.start()
+        try:
+            self._to_optimize.put_nowait(entry)
+        except queue.Full:
+            pass  # stays at the fast renditions until its next put
+
+    def _optimize_loop(self):
+        while True:
+            self.optimize(self._to_optimize.get())
+
+    def optimize(self, entry):
+        """Replace ``entry`` with a max-quality copy if it is still cached"""
+        with self._lock:
+            if self._entries.get(entry.slug) is not entry:
+                return
+        optimized = CachedSite(entry.site_id, entry.slug, entry.version,
+                               entry.body, entry.etag,
+                               compress_renditions(entry.body))
+        with self._lock:
+            if self._entries.get(entry.slug) is entry:
+                self._entries[entry.slug] = optimized
+                self.optimized += 1
+
+    def invalidate(self, *slugs):
+        with self._lock:
+            for slug in slugs:
+                self._entries.pop(slug, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'optimized': self.optimized
+            }
+
+
+site_cache = SiteCache()
@@ -0,0 +1,105 @@
+import os
+import re
+from datetime import datetime
+
+from content_store import content_hash
+from models import db, SiteFile
+
+SITE_MAX_FILES = int(os.getenv('SITE_MAX_FILES', '50'))
+SITE_MAX_FILE_BYTES = int(os.getenv('SITE_MAX_FILE_BYTES', '1048576'))
+
+# index.html is the site's html_content; every other file is a site_file row.
+INDEX_FILE = 'index.html'
+
+_NAME = re.compile(r'^[A-Za-z0-9_-][A-Za-z0-9._-]*(/[A-Za-z0-9_-][A-Za-z0-9._-]*)*$')
+
+
+class FileError(ValueError):
+    """Raised for an invalid file name, size or count"""
+
+
+def check_name(name):
+    if (not isinstance(name, str) or len(name) > 255
+            or not _NAME.match(name)):
+        raise FileError(f'Invalid file name: {name!r}')
+
+
+def file_entry(name, content):
+    return {
+        'name': name,
+        'content': content,
+        'hash': content_hash(content),
+        'size': len(content.encode('utf-8'))
+    }
+
+
+def load_files(site):
+    """Every file of an (overlaid) site in one query, index.html first"""
+    rows = (SiteFile.query.options(db.undefer(SiteFile.content))
+            .filter_by(site_id=site.id).order_by(SiteFile.name).all())
+    return [file_entry(INDEX_FILE, site.html_content)] + [
+        file_entry(row.name, row.content) for row in rows
+    ]
+
+
+def stage_files(site, changes, base_hashes=None):
+    """Add file writes to the session without committing.
+
+    ``changes`` maps names to new content, or None to delete. Names listed
+    in ``base_hashes`` must still have that hash (None meaning the file must
+    not exist). Returns ``(conflicts, html_content)``: the names whose hash
+    moved on, and the new index.html content if it changed. Nothing is
+    staged when there are conflicts.
+    """
+    base_hashes = base_hashes or {}
+    for name, content in changes.items():
+        check_name(name)
+        if content is None:
+            if name == INDEX_FILE:
+                raise FileError('index.html cannot be deleted')
+        elif not isinstance(content, str):
+            raise FileError(f'Content of {name} must be a string')
+        elif len(content.encode('utf-8')) > SITE_MAX_FILE_BYTES:
+            raise FileError(f'{name} is larger than {SITE_MAX_FILE_BYTES} bytes')
+
+    existing = {
+        row.name: row
+        for row in SiteFile.query.filter_by(site_id=site.id).all()
+    }
+    current = {name: row.content_hash for name, row in existing.items()}
+    current[INDEX_FILE] = content_hash(site.html_content)
+    conflicts = [
+        name for name, base in base_hashes.items()
+        if name in changes and current.get(name) != base
+    ]
+    if conflicts:
+        return conflicts, None
+
+    added = [n for n, c in changes.items() if c is not None and n not in current]
+    removed = [n for n, c in changes.items() if c is None and n in existing]
+    if len(existing) + len(added) - len(removed) > SITE_MAX_FILES:
+        raise FileError(f'Sites can have at most {SITE_MAX_FILES} files')
+
+    html_content = None
+    now = datetime.utcnow()
+    for name, content in changes.items():
+        if name == INDEX_FILE:
+            if current[INDEX_FILE] != content_hash(content):
+                html_content = content
+            continue
+        row = existing.get(name)
+        if content is None:
+            if row is not None:
+                db.session.delete(row)
+            continue
+        digest = content_hash(content)
+        if row is None:
+            row = SiteFile(site_id=site.id, name=name)
+            db.session.add(row)
+        elif row.content_hash == digest:
+            continue
+        row.content = content
+        row.content_hash = digest
+        row.size = len(content.encode('utf-8'))
+        row.updated_at = now
+    return [], html_content
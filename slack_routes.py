@@ -1,38 +1,43 @@
 
-from flask import Blueprint, redirect, request, url_for, session, flash
+from flask import redirect, request, url_for, session, flash
 from flask_login import login_user
 from models import db, User
+from http_client import http
+from urllib.parse import quote
 import os
 import requests
 
-slack_bp = Blueprint('slack', __name__)
+# These views are imported on first use; their URL rules are in
+# SLACK_ROUTES in app.py.
+
+SLACK_URL = os.getenv('SLACK_URL', 'https://slack.com')
 
 def get_slack_oauth_url():
     if not os.getenv('SLACK_CLIENT_ID') or not os.getenv('SLACK_REDIRECT_URI'):
         raise ValueError("Slack credentials not configured")
 
-    encoded_redirect_uri = requests.utils.quote(os.getenv('SLACK_REDIRECT_URI'), safe='')
+    encoded_redirect_uri = quote(os.getenv('SLACK_REDIRECT_URI'), safe='')
 
     return (
-        "https://slack.com/oauth/v2/authorize?"
+        f"{SLACK_URL}/oauth/v2/authorize?"
         f"client_id={os.getenv('SLACK_CLIENT_ID')}&"
         "scope=openid,email,profile&"
         f"redirect_uri={encoded_redirect_uri}&"
         "response_type=code"
     )
 
-@slack_bp.route('/api/slack/login')
 def slack_login():
     return redirect(get_slack_oauth_url())
 
-@slack_bp.route('/api/slack/callback')
 def slack_callback():
     code = request.args.get('code')
     if not code:
         flash('Slack authentication failed', 'error')
         return redirect(url_for('login'))
 
-    response = requests.post('https://slack.com/api/oauth.v2.access',
+    try:
+        response = http.post(f'{SLACK_URL}/api/oauth.v2.access',
+                             endpoint='slack.oauth_access',
                              data={
                                  'client_id': os.getenv('SLACK_CLIENT_ID'),
                                  'client_secret':
@@ -41,6 +46,9 @@ def slack_callback():
                                  'redirect_uri':
                                  os.getenv('SLACK_REDIRECT_URI')
                              })
+    except requests.RequestException:
+        flash('Slack is not responding, please try again', 'error')
+        return redirect(url_for('login'))
 
     if not response.ok:
         flash('Failed to authenticate with Slack', 'error')
@@ -53,11 +61,17 @@ def slack_callback():
 
     user_id = data['authed_user']['id']
 
-    user_response = requests.get(
-        'https://slack.com/api/openid.connect.userInfo',
-        headers={
-            'Authorization': f"Bearer {data['authed_user']['access_token']}"
-        })
+    try:
+        user_response = http.get(
+            f'{SLACK_URL}/api/openid.connect.userInfo',
+            endpoint='slack.user_info',
+            headers={
+                'Authorization':
+                f"Bearer {data['authed_user']['access_token']}"
+            })
+    except requests.RequestException:
+        flash('Slack is not responding, please try again', 'error')
+        return redirect(url_for('login'))
 
     if not user_response.ok:
         flash('Failed to get user information', 'error')
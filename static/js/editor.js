@@ -1,10 +1,14 @@
 let editor;
 let currentFile = 'index.html';
 let files = {
-    'index.html': null,
-    'styles.css': null,
-    'script.js': null
+    'index.html': '',
+    'styles.css': '',
+    'script.js': ''
 };
+// Hash of each file as last loaded or saved, sent back as base_hashes so a
+// save never overwrites a change made elsewhere.
+let savedHashes = {};
+let savedFiles = {};
 
 const fileExtToMode = {
     'html': 'html',
@@ -25,16 +29,12 @@ document.addEventListener('DOMContentLoaded', async function() {
         indentWithTabs: false,
         lineWrapping: true,
         extraKeys: {
-            'Ctrl-S': saveCurrentFile,
-            'Cmd-S': saveCurrentFile
+            'Ctrl-S': saveFiles,
+            'Cmd-S': saveFiles
         }
     });
 
-    await Promise.all([
-        loadFile('index.html'),
-        loadFile('styles.css'),
-        loadFile('script.js')
-    ]);
+    await loadFiles();
 
     const fileButtons = document.querySelectorAll('.file-tab');
     fileButtons.forEach(btn => {
@@ -50,16 +50,20 @@ document.addEventListener('DOMContentLoaded', async function() {
     updatePreview();
 });
 
-async function loadFile(filename) {
+async function loadFiles() {
     const siteId = document.getElementById('site-id').value;
     try {
-        const response = await fetch(`/api/sites/${siteId}/files/${filename}`);
-        if (!response.ok) throw new Error(`Failed to load ${filename}`);
+        const response = await fetch(`/api/sites/${siteId}/files`);
+        if (!response.ok) throw new Error('Failed to load files');
         const data = await response.json();
-        files[filename] = data.content;
+        data.files.forEach(file => {
+            files[file.name] = file.content;
+            savedFiles[file.name] = file.content;
+            savedHashes[file.name] = file.hash;
+        });
     } catch (error) {
-        console.error(`Error loading ${filename}:`, error);
-        showNotification(`Error loading ${filename}`, 'error');
+        console.error('Error loading files:', error);
+        showNotification('Error loading files', 'error');
     }
 }
 
@@ -77,25 +81,44 @@ function switchFile(filename) {
     });
 }
 
-async function saveCurrentFile() {
+async function saveFiles() {
     const siteId = document.getElementById('site-id').value;
-    const content = editor.getValue();
-    files[currentFile] = content;
+    files[currentFile] = editor.getValue();
+
+    const changed = {};
+    const baseHashes = {};
+    Object.keys(files).forEach(name => {
+        if (files[name] !== savedFiles[name]) {
+            changed[name] = files[name];
+            baseHashes[name] = savedHashes[name] || null;
+        }
+    });
+    if (!Object.keys(changed).length) return;
 
     try {
-        const response = await fetch(`/api/sites/${siteId}/files/${currentFile}`, {
+        const response = await fetch(`/api/sites/${siteId}/files`, {
             method: 'PUT',
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ content })
+            body: JSON.stringify({ files: changed, base_hashes: baseHashes })
         });
 
-        if (!response.ok) throw new Error(`Failed to save ${currentFile}`);
-        showNotification(`${currentFile} saved successfully`, 'success');
+        if (response.status === 409) {
+            const data = await response.json();
+            showNotification(`${data.conflicts.join(', ')} changed elsewhere, reload to continue`, 'error');
+            return;
+        }
+        if (!response.ok) throw new Error('Failed to save files');
+        const data = await response.json();
+        Object.keys(changed).forEach(name => {
+            savedFiles[name] = changed[name];
+            savedHashes[name] = data.hashes[name];
+        });
+        showNotification('Files saved successfully', 'success');
     } catch (error) {
-        console.error(`Error saving ${currentFile}:`, error);
-        showNotification(`Error saving ${currentFile}`, 'error');
+        console.error('Error saving files:', error);
+        showNotification('Error saving files', 'error');
     }
 }
 
@@ -123,7 +146,7 @@ function updatePreview() {
 async function deploySite() {
     const siteId = document.getElementById('site-id').value;
     
-    await saveCurrentFile();
+    await saveFiles();
 
     try {
         const response = await fetch(`/api/sites/${siteId}/deploy`, {
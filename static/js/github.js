@@ -241,11 +241,17 @@ async function createRepository(event) {
         });
 
         if (response.ok) {
-            showToast('success', 'Repository created successfully');
-            showPushChanges();
+            const { job_id } = await response.json();
+            const job = await waitForGitHubJob(job_id);
+            if (job.status === 'succeeded') {
+                showToast('success', 'Repository created successfully');
+                showPushChanges();
+            } else {
+                showToast('error', job.error || 'Failed to create repository');
+            }
         } else {
             const error = await response.json();
-            showToast('error', error.message || 'Failed to create repository');
+            showToast('error', error.error || error.message || 'Failed to create repository');
         }
     } catch (error) {
         console.error('Create repository error:', error);
@@ -257,6 +263,22 @@ async function createRepository(event) {
     }
 }
 
+async function waitForGitHubJob(jobId) {
+    let delay = 500;
+    while (true) {
+        const response = await fetch(`/api/github/jobs/${jobId}`);
+        const job = await response.json();
+        if (!response.ok) {
+            return { status: 'failed', error: job.error };
+        }
+        if (job.status === 'succeeded' || job.status === 'failed') {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, delay));
+        delay = Math.min(delay * 1.5, 3000);
+    }
+}
+
 async function pushChanges(event) {
     event.preventDefault();
 
@@ -316,12 +338,20 @@ async function pushChanges(event) {
         });
 
         if (response.ok) {
-            const data = await response.json();
-            showToast('success', 'Changes pushed to GitHub! 🚀');
-            closeGitHubModal();
+            const { job_id } = await response.json();
+            const job = await waitForGitHubJob(job_id);
+            if (job.status !== 'succeeded') {
+                showToast('error', job.error || 'Failed to push changes');
+            } else if (job.result && !job.result.commit_sha) {
+                showToast('success', 'GitHub is already up to date');
+                closeGitHubModal();
+            } else {
+                showToast('success', 'Changes pushed to GitHub! 🚀');
+                closeGitHubModal();
+            }
         } else {
             const error = await response.json();
-            showToast('error', error.message || 'Failed to push changes');
+            showToast('error', error.error || error.message || 'Failed to push changes');
         }
     } catch (error) {
         console.error('Push error:', error);
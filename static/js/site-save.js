@@ -0,0 +1,49 @@
+// Single splice turning `base` into `current`, as [start, end, insert] with
+// offsets in UTF-16 code units (JavaScript string indexes).
+function computePatch(base, current) {
+    let start = 0;
+    const limit = Math.min(base.length, current.length);
+    while (start < limit && base.charCodeAt(start) === current.charCodeAt(start)) {
+        start++;
+    }
+
+    let baseEnd = base.length;
+    let currentEnd = current.length;
+    while (baseEnd > start && currentEnd > start &&
+           base.charCodeAt(baseEnd - 1) === current.charCodeAt(currentEnd - 1)) {
+        baseEnd--;
+        currentEnd--;
+    }
+
+    if (start === baseEnd && start === currentEnd) {
+        return [];
+    }
+    return [[start, baseEnd, current.slice(start, currentEnd)]];
+}
+
+// Saves `field` (html or python) of a site as a patch against the last
+// saved version. `state` holds the saved text and its version number.
+async function saveSiteContent(url, field, state, content) {
+    const patch = computePatch(state.saved, content);
+    if (!patch.length) {
+        return {ok: true, unchanged: true};
+    }
+
+    const response = await fetch(url, {
+        method: 'PUT',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            base_version: state.version,
+            [`${field}_patch`]: patch
+        })
+    });
+    const data = await response.json();
+
+    if (response.ok) {
+        state.saved = content;
+        state.version = data.version;
+    }
+    return {ok: response.ok, status: response.status, data};
+}
@@ -0,0 +1,146 @@
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from flask import abort, make_response, request, url_for
+
+from publisher import hashed_name
+from site_cache import compress_renditions
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+STATIC_ASSETS_MAX_AGE = int(os.getenv('STATIC_ASSETS_MAX_AGE', '31536000'))
+
+_HASHED = re.compile(r'^(.*)\.[0-9a-f]{12}(\.[^./]+)?$')
+
+
+def minify(name, body):
+    """Minify CSS/JS text when the minifier is installed"""
+    if name.endswith('.css') and rcssmin is not None:
+        return rcssmin.cssmin(body.decode('utf-8')).encode('utf-8')
+    if name.endswith('.js') and rjsmin is not None:
+        return rjsmin.jsmin(body.decode('utf-8')).encode('utf-8')
+    return body
+
+
+class Asset:
+    """A fingerprinted static file held in memory with its compressed variants"""
+
+    __slots__ = ('name', 'url_name', 'mtime', 'body', 'etag', 'encodings',
+                 'mimetype')
+
+    def __init__(self, name, mtime, body):
+        digest = hashlib.sha256(body).hexdigest()
+        self.name = name
+        self.url_name = hashed_name(name, digest)
+        self.mtime = mtime
+        self.body = body
+        self.etag = digest[:32]
+        self.mimetype = (mimetypes.guess_type(name)[0]
+                         or 'application/octet-stream')
+        self.encodings = {}
+        if self.mimetype.startswith('text/') or name.endswith(
+            ('.js', '.svg')):
+            self.encodings = compress_renditions(body.decode('utf-8'))
+
+
+class StaticAssets:
+    """Serves /static files under content-hashed URLs with far-future caching.
+
+    Templates call ``asset_url('css/style.css')``. The first call for a file
+    reads, minifies, fingerprints and compresses it; later calls reuse the
+    result (rechecking the file's mtime when ``reload`` is on, which it is
+    in debug mode). Files that cannot be read fall back to the plain
+    ``static`` URL.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.reload = False
+        self._by_name = {}
+        self._by_url = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.reload = app.debug
+        app.extensions['static_assets'] = self
+        app.add_url_rule('/assets/<path:name>', 'static_asset', self.serve)
+        app.add_template_global(self.url, 'asset_url')
+
+    def _load(self, name):
+        path = os.path.normpath(os.path.join(self.app.static_folder, name))
+        if os.path.commonpath([path, self.app.static_folder]) != \
+                self.app.static_folder:
+            return None
+        with self._lock:
+            asset = self._by_name.get(name)
+        if asset is not None and not self.reload:
+            return asset
+        try:
+            mtime = os.path.getmtime(path)
+            if asset is not None and asset.mtime == mtime:
+                return asset
+            with open(path, 'rb') as f:
+                body = minify(name, f.read())
+        except (OSError, UnicodeDecodeError):
+            return None
+        asset = Asset(name, mtime, body)
+        with self._lock:
+            previous = self._by_name.get(name)
+            if previous is not None:
+                self._by_url.pop(previous.url_name, None)
+            self._by_name[name] = asset
+            self._by_url[asset.url_name] = asset
+        return asset
+
+    def url(self, name):
+        asset = self._load(name)
+        if asset is None:
+            return url_for('static', filename=name)
+        return url_for('static_asset', name=asset.url_name)
+
+    def serve(self, name):
+        with self._lock:
+            asset = self._by_url.get(name)
+        if asset is None:
+            # Another process may have rendered the page; build it here.
+            match = _HASHED.match(name)
+            if match:
+                asset = self._load(match.group(1) + (match.group(2) or ''))
+            if asset is None or asset.url_name != name:
+                abort(404)
+
+        encoding = request.accept_encodings.best_match(asset.encodings)
+        if encoding:
+            response = make_response(asset.encodings[encoding])
+            response.content_encoding = encoding
+            response.set_etag(f'{asset.etag}-{encoding}')
+        else:
+            response = make_response(asset.body)
+            response.set_etag(asset.etag)
+        response.mimetype = asset.mimetype
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_ASSETS_MAX_AGE
+        response.cache_control.immutable = True
+        return response.make_conditional(request)
+
+    def stats(self):
+        with self._lock:
+            return {'assets': len(self._by_name)}
+
+
+static_assets = StaticAssets()
@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# The app reads its configuration at import time.
+_DATA_DIR = tempfile.mkdtemp(prefix='spaces-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_DATA_DIR, 'test.db')}"
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def app():
+    from app import app
+    from models import db
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def github(monkeypatch):
+    """A running ``FakeGitHub`` that the GitHub client code talks to"""
+    import github_client
+    from benchmarks.fake_github import FakeGitHub
+
+    fake = FakeGitHub().start()
+    monkeypatch.setattr(github_client, 'GITHUB_API_URL', fake.url)
+    monkeypatch.setattr(github_client, 'GITHUB_SECONDS_BETWEEN_WRITES', 0)
+    monkeypatch.setattr(github_client, 'github_cache',
+                        github_client.GitHubCache())
+    yield fake
+    fake.stop()
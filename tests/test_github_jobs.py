@@ -0,0 +1,67 @@
+import time
+
+from github_jobs import GitHubJobQueue
+from models import db, GitHubJob, GitHubRepo, Site, User
+
+
+def wait_for(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/github/jobs/{job_id}').get_json()
+        if job['status'] in ('succeeded', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+def test_status_is_stored_for_other_processes(app):
+    jobs = GitHubJobQueue()
+    jobs.init_app(app)
+    job = jobs.submit('push', 1, 7, lambda value: {'value': value},
+                      {'value': 42})
+    deadline = time.monotonic() + 5
+    while jobs.get(job['id'])['status'] != 'succeeded':
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    # A process that never saw the job reads it from the table.
+    other = GitHubJobQueue()
+    other.init_app(app)
+    stored = other.get(job['id'])
+    assert stored['user_id'] == 7
+    assert stored['result'] == {'value': 42}
+    assert db.session.get(GitHubJob, job['id']).finished_at is not None
+
+
+def test_push_job_looks_up_the_token(app, github):
+    user = User(username='alice',
+                email='alice@example.com',
+                github_token='gho_alice')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.flush()
+    site = Site(name='home', slug='home', user_id=user.id,
+                html_content='<h1>Hi</h1>')
+    db.session.add(site)
+    db.session.flush()
+    db.session.add(
+        GitHubRepo(repo_name='bench/home',
+                   repo_url='https://github.com/bench/home',
+                   site_id=site.id))
+    db.session.commit()
+
+    client = app.test_client()
+    client.post('/login',
+                data={
+                    'email': 'alice@example.com',
+                    'password': 'password123'
+                })
+    response = client.post(f'/api/github/push?site_id={site.id}',
+                           json={'message': 'Publish'})
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    job = wait_for(client, job_id)
+    assert job['status'] == 'succeeded', job['error']
+    assert job['result']['changed'] == ['index.html', 'main.py']
+    assert github.head('bench/home')[0] == job['result']['commit_sha']
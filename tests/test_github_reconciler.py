@@ -0,0 +1,113 @@
+from github_reconciler import GitHubRepoReconciler
+from models import db, GitHubRepo, Site, User
+
+
+def add_repo(name, token='gho_alice', user=None):
+    if user is None:
+        user = User.query.filter_by(github_token=token).first()
+    if user is None:
+        user = User(username=token,
+                    email=f'{token}@example.com',
+                    password_hash='-',
+                    github_token=token)
+        db.session.add(user)
+        db.session.flush()
+    site = Site(name=name, slug=name, user_id=user.id)
+    db.session.add(site)
+    db.session.flush()
+    repo = GitHubRepo(repo_name=f'bench/{name}',
+                      repo_url=f'https://github.com/bench/{name}',
+                      site_id=site.id)
+    db.session.add(repo)
+    db.session.commit()
+    return repo.id
+
+
+def reconciler(app, **kwargs):
+    reconciler = GitHubRepoReconciler(interval=300, **kwargs)
+    reconciler.app = app
+    return reconciler
+
+
+def test_existing_repo_is_ok(app, github):
+    repo_id = add_repo('plain')
+    assert reconciler(app).run_once() == {'ok': 1}
+    repo = db.session.get(GitHubRepo, repo_id)
+    assert repo.verify_status == 'ok'
+    assert repo.last_verified_at is not None
+
+
+def test_renamed_repo_updates_url(app, github):
+    repo_id = add_repo('old-name')
+    github.renamed['bench/old-name'] = 'bench/new-name'
+    assert reconciler(app).run_once() == {'updated': 1}
+    repo = db.session.get(GitHubRepo, repo_id)
+    assert repo.repo_url == 'https://github.com/bench/new-name'
+    assert repo.verify_status == 'ok'
+
+
+def test_missing_repo_is_deleted(app, github):
+    repo_id = add_repo('gone')
+    github.missing.add('bench/gone')
+    assert reconciler(app).run_once() == {'deleted': 1}
+    assert db.session.get(GitHubRepo, repo_id) is None
+
+
+def test_revoked_token_is_auth_error(app, github):
+    repo_id = add_repo('revoked', token='gho_revoked')
+    github.revoked.add('gho_revoked')
+    assert reconciler(app).run_once() == {'auth_error': 1}
+    assert db.session.get(GitHubRepo, repo_id).verify_status == 'auth_error'
+
+
+def test_spent_token_budget_defers_the_rest(app, github):
+    first = add_repo('one')
+    second = add_repo('two')
+    other = add_repo('three', token='gho_bob')
+    assert reconciler(app, per_token=1).run_once() == {'ok': 2, 'deferred': 1}
+    assert db.session.get(GitHubRepo, first).verify_status == 'ok'
+    assert db.session.get(GitHubRepo, second).last_verified_at is None
+    assert db.session.get(GitHubRepo, other).verify_status == 'ok'
+
+    # The next pass picks up the deferred row and skips the fresh ones.
+    assert reconciler(app, per_token=1).run_once() == {'ok': 1}
+    assert db.session.get(GitHubRepo, second).verify_status == 'ok'
+
+
+def test_low_rate_limit_defers(app, github):
+    add_repo('one')
+    add_repo('two')
+    # The fake reports 4999 remaining after the first call.
+    outcomes = reconciler(app, min_remaining=5000).run_once()
+    assert outcomes == {'ok': 1, 'deferred': 1}
+
+
+def test_reconnecting_clears_the_auth_error(app, github, monkeypatch):
+    import github_routes
+
+    monkeypatch.setattr(github_routes, 'GITHUB_OAUTH_URL', github.url)
+    repo_id = add_repo('revoked', token='gho_revoked')
+    github.revoked.add('gho_revoked')
+    reconciler(app).run_once()
+    user = User.query.filter_by(github_token='gho_revoked').one()
+    user.set_password('password123')
+    db.session.commit()
+
+    client = app.test_client()
+    client.post('/login',
+                data={
+                    'email': user.email,
+                    'password': 'password123'
+                })
+    site_id = db.session.get(GitHubRepo, repo_id).site_id
+    assert client.get(
+        f'/api/github/repo-info?site_id={site_id}').status_code == 401
+
+    # The fake hands out gho_<code> as the new token.
+    client.get('/api/github/callback?code=fresh')
+    db.session.expire_all()
+    repo = db.session.get(GitHubRepo, repo_id)
+    assert repo.verify_status is None
+    assert repo.last_verified_at is None
+    response = client.get(f'/api/github/repo-info?site_id={site_id}')
+    assert response.status_code == 200
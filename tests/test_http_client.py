@@ -0,0 +1,116 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_client import HTTPClient
+
+
+class StubServer(ThreadingHTTPServer):
+    """Answers each request with the next scripted ``(status, delay)``"""
+
+    daemon_threads = True
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.hits = 0
+        super().__init__(('127.0.0.1', 0), StubHandler)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}/'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def handle_one(self):
+        self.server.hits += 1
+        status, delay = (self.server.script.pop(0)
+                         if self.server.script else (200, 0))
+        time.sleep(delay)
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    do_GET = do_POST = handle_one
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(*script):
+        server = StubServer(script)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_read_timeout_is_retried_then_raised(stub):
+    server = stub((200, 1), (200, 1), (200, 1))
+    client = HTTPClient(read_timeout=0.2, retries=2)
+    with pytest.raises(requests.ConnectionError):
+        client.get(server.url)
+    assert server.hits == 3
+
+
+def test_connect_timeout():
+    # A listener whose accept queue is full never completes new handshakes.
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(0)
+    fillers = []
+    try:
+        for _ in range(4):
+            filler = socket.socket()
+            filler.setblocking(False)
+            filler.connect_ex(listener.getsockname())
+            fillers.append(filler)
+        client = HTTPClient(connect_timeout=0.2, retries=0)
+        started = time.monotonic()
+        with pytest.raises(requests.ConnectTimeout):
+            client.get('http://%s:%d/' % listener.getsockname())
+        assert time.monotonic() - started < 2
+    finally:
+        for sock in fillers + [listener]:
+            sock.close()
+
+
+def test_get_retries_server_errors(stub):
+    server = stub((503, 0), (502, 0))
+    response = HTTPClient(retries=2).get(server.url)
+    assert response.status_code == 200
+    assert server.hits == 3
+
+
+def test_post_is_not_retried(stub):
+    server = stub((503, 0))
+    response = HTTPClient(retries=2).post(server.url)
+    assert response.status_code == 503
+    assert server.hits == 1
+
+
+def test_full_pool_wait_is_bounded(stub):
+    server = stub((200, 1))
+    client = HTTPClient(per_host=1, pool_timeout=0.2, retries=0)
+    holder = threading.Thread(target=client.get, args=(server.url, ))
+    holder.start()
+    time.sleep(0.1)  # let it take the only connection
+    started = time.monotonic()
+    with pytest.raises(requests.ConnectionError):
+        client.get(server.url)
+    assert time.monotonic() - started < 0.9
+    holder.join()
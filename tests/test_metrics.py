@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+from metrics import FOLD_EVERY, Metrics
+from query_timing import query_timing
+
+
+def test_dead_thread_shards_fold_without_a_scrape():
+    metrics = Metrics()
+    for _ in range(FOLD_EVERY * 3):
+        thread = threading.Thread(
+            target=metrics.inc, args=('spaces_db_queries_total', ))
+        thread.start()
+        thread.join()
+    assert len(metrics._shards) <= FOLD_EVERY
+    counters, _ = metrics.collect()
+    assert counters[('spaces_db_queries_total', ())] == FOLD_EVERY * 3
+
+
+def test_failed_statement_does_not_leak_its_start_time():
+    metrics = Metrics()
+    query_timing.subscribe(metrics._record_query)
+    engine = create_engine('sqlite://')
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql('SELECT * FROM missing')
+        conn.exec_driver_sql('SELECT 1')
+        assert conn.info['query_started'] == []
+    counters, _ = metrics.collect()
+    assert counters[('spaces_db_queries_total',
+                     (('endpoint', 'background'), ))] == 1
+
+
+def test_query_spans_come_from_the_shared_timing_hook():
+    from tracing import SERVER, Span, Tracer, _current
+
+    class RecordingExporter:
+
+        def __init__(self):
+            self.spans = []
+
+        def export(self, span):
+            self.spans.append(span)
+
+    exporter = RecordingExporter()
+    tracer = Tracer(sample_rate=1.0, exporter=exporter)
+    query_timing.subscribe(tracer._record_query)
+    engine = create_engine('sqlite://')
+    request = Span('request', '1' * 32, None, SERVER, {})
+    token = _current.set(request)
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql('SELECT 1')
+    finally:
+        _current.reset(token)
+    with engine.connect() as conn:
+        conn.exec_driver_sql('SELECT 2')
+
+    assert [span.attributes['db.statement']
+            for span in exporter.spans] == ['SELECT 1']
+    assert exporter.spans[0].parent_id == request.span_id
+    assert exporter.spans[0].start_ns <= exporter.spans[0].end_ns
@@ -0,0 +1,83 @@
+import pytest
+
+import github_client
+from github_client import git_blob_sha, push_files
+
+
+@pytest.fixture
+def repo(github):
+    return github_client.get_client('gho_alice').get_repo('bench/site')
+
+
+def test_push_makes_one_commit(github, repo):
+    files = {'index.html': '<h1>Hi</h1>', 'main.py': 'print(1)'}
+    sha, changed = push_files(repo, files, 'Update site')
+
+    assert sorted(changed) == ['index.html', 'main.py']
+    head, tree = github.head('bench/site')
+    assert head == sha
+    assert github.commits('bench/site') == 2
+    assert tree['index.html'] == git_blob_sha(files['index.html'])
+    assert tree['main.py'] == git_blob_sha(files['main.py'])
+
+
+def test_unchanged_push_is_a_no_op(github, repo):
+    files = {'index.html': '<h1>Hi</h1>'}
+    push_files(repo, files, 'Update site')
+    head, _ = github.head('bench/site')
+    trees = len(github.posted_trees)
+
+    assert push_files(repo, files, 'Update site') == (None, [])
+    assert github.head('bench/site')[0] == head
+    assert github.commits('bench/site') == 2
+    assert len(github.posted_trees) == trees
+
+
+def test_only_changed_blobs_are_sent(github, repo):
+    push_files(repo, {
+        'index.html': '<h1>Hi</h1>',
+        'main.py': 'print(1)'
+    }, 'Update site')
+    sha, changed = push_files(repo, {
+        'index.html': '<h1>Hello</h1>',
+        'main.py': 'print(1)'
+    }, 'Update site')
+
+    assert changed == ['index.html']
+    assert github.posted_trees[-1] == ['index.html']
+    head, tree = github.head('bench/site')
+    assert head == sha
+    assert github.commits('bench/site') == 3
+    assert tree['index.html'] == git_blob_sha('<h1>Hello</h1>')
+    assert tree['main.py'] == git_blob_sha('print(1)')
+
+
+class RecordingExporter:
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+def test_every_github_call_gets_a_span(github, repo, monkeypatch):
+    from tracing import SERVER, Span, Tracer
+
+    exporter = RecordingExporter()
+    tracer = Tracer(sample_rate=1.0, exporter=exporter)
+    monkeypatch.setattr(github_client, 'tracer', tracer)
+    push_files(repo, {'index.html': '<h1>Hi</h1>'}, 'Update site')
+    request = Span('request', '1' * 32, None, SERVER, {})
+    with tracer.span('job', parent=request) as job:
+        push_files(repo, {'index.html': '<h1>Hello</h1>'}, 'Update site')
+
+    assert [span.name for span in exporter.spans] == [
+        'github.get_branch', 'github.get_tree', 'github.create_tree',
+        'github.create_commit', 'github.get_ref', 'github.update_ref',
+        'github.push_files', 'job'
+    ]
+    push = exporter.spans[-2]
+    assert push.parent_id == job.span_id
+    assert all(span.parent_id == push.span_id
+               for span in exporter.spans[:-2])
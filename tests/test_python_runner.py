@@ -0,0 +1,99 @@
+import os
+import time
+
+import pytest
+
+from python_runner import OutputRing, PythonRunner
+
+SLEEPER = '''
+import os, subprocess, sys, time
+child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(10**9)'])
+print(os.getpid(), child.pid, flush=True)
+time.sleep(10**9)
+'''
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A zombie still answers signal 0 until its parent reaps it.
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+def wait_gone(pids, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not any(alive(pid) for pid in pids):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def runner():
+    runner = PythonRunner(workers=1, timeout=60)
+    yield runner
+    runner.shutdown()
+
+
+def test_run_collects_output(runner):
+    result = runner.run('print(6 * 7)')
+    assert result['ok']
+    assert result['stdout'] == '42\n'
+
+
+def test_cancelled_stream_leaves_no_processes(runner):
+    job = runner.submit(SLEEPER)
+    events = iter(job)
+    stream, text = next(events)
+    assert stream == 'stdout'
+    pids = [int(pid) for pid in text.split()]
+    assert all(alive(pid) for pid in pids)
+
+    job.close()  # what a client disconnect does
+
+    assert wait_gone(pids)
+    assert runner.stats()['replaced'] == 1
+    # The replacement worker still runs jobs.
+    assert runner.run('print(1)')['stdout'] == '1\n'
+
+
+def test_output_ring_keeps_order_after_overflow():
+    ring = OutputRing(live_limit=10, tail_chunks=10)
+    live = [text for text in ('aaaaaaaa', 'BBBB', 'c')
+            if ring.accept('stdout', text)]
+    assert live == ['aaaaaaaa']
+    assert [text for _, text in ring.drain()] == ['BBBB', 'c']
+
+
+def test_deadline_holds_when_the_reader_stalls():
+    runner = PythonRunner(workers=1, timeout=1)
+    try:
+        job = runner.submit('import os\n'
+                            'print(os.getpid(), flush=True)\n'
+                            'while True:\n'
+                            '    print("x" * 4000, flush=True)\n')
+        events = iter(job)
+        pid = int(next(events)[1])
+        # Stop reading: the worker's sends back up until the deadline.
+        assert wait_gone([pid], timeout=5)
+        job.close()
+    finally:
+        runner.shutdown()
+
+
+def test_failed_rlimit_setup_fails_the_job_only(runner):
+    runner.cpu_seconds = 'not a number'
+    result = runner.run('print(1)')
+    assert not result['ok']
+    assert result['error'].startswith('Could not set resource limits')
+    assert result['stdout'] == ''
+
+    runner.cpu_seconds = 5
+    assert runner.run('print(2)')['stdout'] == '2\n'
@@ -0,0 +1,87 @@
+import time
+
+from models import db, Site, User
+from site_cache import site_cache, site_etag
+
+
+def test_view_site_revalidates_against_the_stored_version(app):
+    user = User(username='alice', email='alice@example.com',
+                password_hash='-')
+    db.session.add(user)
+    db.session.flush()
+    site = Site(name='home', slug='home', user_id=user.id,
+                html_content='<h1>One</h1>')
+    db.session.add(site)
+    db.session.commit()
+    client = app.test_client()
+
+    first = client.get('/s/home/')
+    assert first.data == b'<h1>One</h1>'
+    assert site_cache.get('home', site.id, 1) is not None
+
+    # Another process saves: this process' cache is not told.
+    db.session.execute(
+        Site.__table__.update().where(Site.id == site.id).values(
+            html_content='<h1>Two</h1>', version=2))
+    db.session.commit()
+
+    second = client.get('/s/home/', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.data == b'<h1>Two</h1>'
+
+    db.session.execute(
+        Site.__table__.update().where(Site.id == site.id).values(
+            is_public=False))
+    db.session.commit()
+    assert client.get('/s/home/').status_code == 403
+
+
+def test_etag_changes_with_the_version():
+    assert site_etag('<h1>Hi</h1>', 1) != site_etag('<h1>Hi</h1>', 2)
+    assert site_etag('<h1>Hi</h1>', 1) != site_etag('<h1>Ho</h1>', 1)
+
+
+def test_reused_slug_is_not_served_from_another_sites_entry(app):
+    user = User(username='bob', email='bob@example.com', password_hash='-')
+    db.session.add(user)
+    db.session.flush()
+    old = Site(name='old', slug='shared', user_id=user.id,
+               html_content='<h1>Old</h1>')
+    db.session.add(old)
+    # Keeps SQLite from handing the deleted id out again.
+    db.session.add(Site(name='other', slug='other', user_id=user.id))
+    db.session.commit()
+    client = app.test_client()
+    assert client.get('/s/shared/').data == b'<h1>Old</h1>'
+
+    # Another process deletes the site and a new one takes its slug, both
+    # at version 1.
+    db.session.delete(old)
+    db.session.add(Site(name='new', slug='shared', user_id=user.id,
+                        html_content='<h1>New</h1>'))
+    db.session.commit()
+
+    assert client.get('/s/shared/').data == b'<h1>New</h1>'
+
+
+def test_put_compresses_fast_then_optimizes_in_the_background():
+    from types import SimpleNamespace
+
+    from site_cache import SiteCache
+
+    body = ''.join(f'<p>Paragraph {n} of the page.</p>\n'
+                   for n in range(500))
+    cache = SiteCache()
+    entry = cache.put(
+        SimpleNamespace(id=1, slug='big', version=1, is_public=True,
+                        html_content=body))
+    assert not entry.optimized
+    assert entry.encoding_etag('gzip').endswith('-gzip-fast')
+
+    deadline = time.monotonic() + 10
+    while not cache.get('big', 1, 1).optimized:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    optimized = cache.get('big', 1, 1)
+    assert optimized.encoding_etag('gzip').endswith('-gzip')
+    assert len(optimized.encodings['br']) <= len(entry.encodings['br'])
@@ -0,0 +1,71 @@
+import main  # noqa: F401  registers /healthz before any request
+
+
+def test_slugs_without_a_slash_redirect(app):
+    response = app.test_client().get('/s/home')
+    assert response.status_code == 308
+    assert response.headers['Location'].endswith('/s/home/')
+
+
+def test_healthz_answers_while_the_database_is_down(app, monkeypatch):
+    from app import db_health
+
+    monkeypatch.setattr(db_health, 'breaker_open', True)
+    client = app.test_client()
+    assert client.get('/healthz').status_code == 200
+    assert client.get('/s/home/').status_code == 503
+
+
+def login_owner(app):
+    from models import db, Site, User
+
+    user = User(username='carol', email='carol@example.com')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.flush()
+    site = Site(name='files', slug='files', user_id=user.id,
+                html_content='<h1>One</h1>')
+    db.session.add(site)
+    db.session.commit()
+    client = app.test_client()
+    client.post('/login',
+                data={
+                    'email': 'carol@example.com',
+                    'password': 'password123'
+                })
+    return client, site.id
+
+
+def test_saving_files_moves_the_version_and_records_a_revision(app):
+    from models import SiteRevision
+
+    client, site_id = login_owner(app)
+    response = client.put(f'/api/sites/{site_id}/files',
+                          json={'files': {'style.css': 'h1 {}'}})
+    assert response.status_code == 200
+    assert response.get_json()['version'] == 2
+    assert SiteRevision.query.filter_by(site_id=site_id,
+                                        version=2).count() == 1
+
+    response = client.put(f'/api/sites/{site_id}/files',
+                          json={'files': {'index.html': '<h1>Two</h1>'}})
+    assert response.get_json()['version'] == 3
+    assert client.get('/s/files/').data == b'<h1>Two</h1>'
+
+
+def test_saving_files_from_a_stale_base_conflicts(app):
+    client, site_id = login_owner(app)
+    first = client.put(f'/api/sites/{site_id}/files',
+                       json={'files': {'style.css': 'h1 {}'}})
+    base = first.get_json()['hashes']
+
+    client.put(f'/api/sites/{site_id}/files',
+               json={'files': {'style.css': 'h1 { color: red }'},
+                     'base_hashes': base})
+    response = client.put(f'/api/sites/{site_id}/files',
+                          json={'files': {'style.css': 'h1 { color: blue }'},
+                                'base_hashes': base})
+    assert response.status_code == 409
+    assert response.get_json()['conflicts'] == ['style.css']
+    files = client.get(f'/api/sites/{site_id}/files').get_json()
+    assert files['version'] == 3
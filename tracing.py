@@ -0,0 +1,374 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'jsonl')
+TRACE_FILE = os.getenv(
+    'TRACE_FILE', os.path.join(tempfile.gettempdir(), 'spaces-traces.jsonl'))
+TRACE_OTLP_URL = os.getenv('TRACE_OTLP_URL',
+                           'http://127.0.0.1:4318/v1/traces')
+TRACE_BATCH_SIZE = int(os.getenv('TRACE_BATCH_SIZE', '256'))
+TRACE_FLUSH_INTERVAL = float(os.getenv('TRACE_FLUSH_INTERVAL', '2'))
+TRACE_QUEUE_SIZE = int(os.getenv('TRACE_QUEUE_SIZE', '10000'))
+TRACE_STATEMENT_MAX = 1000
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current = ContextVar('trace_span', default=None)
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """One timed operation in a trace"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind',
+                 'start_ns', 'end_ns', 'attributes', 'error', 'sampled')
+
+    def __init__(self, name, trace_id, parent_id, kind, attributes,
+                 sampled=True):
+        self.trace_id = trace_id
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+        self.sampled = sampled
+
+    def set(self, key, value):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def fail(self, error):
+        if self.sampled:
+            self.error = str(error)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+# Stands in for every span of a trace that was not sampled.
+UNSAMPLED = Span('unsampled', None, None, INTERNAL, {}, sampled=False)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_payload(spans, service='spaces'):
+    """OTLP/HTTP JSON body for finished spans (as ``Span.to_dict``)"""
+    return {
+        'resourceSpans': [{
+            'resource': {
+                'attributes': [{
+                    'key': 'service.name',
+                    'value': {'stringValue': service}
+                }]
+            },
+            'scopeSpans': [{
+                'scope': {'name': service},
+                'spans': [{
+                    'traceId': span['trace_id'],
+                    'spanId': span['span_id'],
+                    'parentSpanId': span['parent_id'] or '',
+                    'name': span['name'],
+                    'kind': span['kind'],
+                    'startTimeUnixNano': str(span['start_ns']),
+                    'endTimeUnixNano': str(span['end_ns']),
+                    'attributes': [{
+                        'key': key,
+                        'value': _otlp_value(value)
+                    } for key, value in span['attributes'].items()],
+                    'status': ({'code': 2, 'message': span['error']}
+                               if span['error'] else {'code': 1})
+                } for span in spans]
+            }]
+        }]
+    }
+
+
+class SpanExporter:
+    """Ships finished spans from a background thread in batches.
+
+    Spans go to a JSON-lines file or are POSTed to an OTLP/HTTP collector.
+    The queue is bounded; when the exporter falls behind, new spans are
+    dropped and counted instead of slowing requests down.
+    """
+
+    def __init__(self,
+                 exporter=TRACE_EXPORTER,
+                 path=TRACE_FILE,
+                 otlp_url=TRACE_OTLP_URL,
+                 batch_size=TRACE_BATCH_SIZE,
+                 interval=TRACE_FLUSH_INTERVAL,
+                 max_queued=TRACE_QUEUE_SIZE):
+        self.exporter = exporter
+        self.path = path
+        self.otlp_url = otlp_url
+        self.batch_size = batch_size
+        self.interval = interval
+        self.exported = 0
+        self.dropped = 0
+        self.failures = 0
+        self._queue = queue.Queue(max_queued)
+        self._thread = None
+        self._closing = threading.Event()
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop,
+                                                name='trace-exporter',
+                                                daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while not (self._closing.is_set() and self._queue.empty()):
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closing.is_set():
+                    remaining = 0
+                try:
+                    batch.append(self._queue.get(timeout=remaining)
+                                 if remaining else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+
+    def close(self):
+        """Write out every queued span; called at exit"""
+        self._closing.set()
+        if self._thread is not None:
+            self._thread.join(5)
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch):
+        spans = [span.to_dict() for span in batch]
+        try:
+            if self.exporter == 'otlp':
+                import urllib.request
+                request = urllib.request.Request(
+                    self.otlp_url,
+                    data=json.dumps(otlp_payload(spans)).encode('utf-8'),
+                    headers={'Content-Type': 'application/json'})
+                urllib.request.urlopen(request, timeout=5).close()
+            else:
+                with open(self.path, 'a') as f:
+                    f.writelines(json.dumps(span) + '\n' for span in spans)
+            self.exported += len(spans)
+        except (OSError, ValueError) as e:
+            self.failures += 1
+            logger.warning('Failed to export %d spans: %s', len(spans), e)
+
+
+class Tracer:
+    """Request tracing with spans kept in a context variable.
+
+    Tracing is on when ``TRACE_SAMPLE_RATE`` is above zero. A sampled
+    request (by that rate, or by a W3C ``traceparent`` header carrying the
+    sampled flag) gets a server span; SQL statements, outbound
+    HTTP calls, GitHub operations and Python runs open child spans of
+    whatever span is current. Work handed to another thread passes the
+    span along explicitly (see ``github_jobs``). Unsampled requests only
+    pay for a context variable lookup per instrumented call.
+    """
+
+    def __init__(self, sample_rate=TRACE_SAMPLE_RATE, exporter=None):
+        self.sample_rate = sample_rate
+        self.enabled = sample_rate > 0
+        self.exporter = exporter or SpanExporter()
+        self.app = None
+        self.db_system = None
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['tracing'] = self
+        if not self.enabled:
+            return
+        atexit.register(self.exporter.close)
+        from flask import g, request
+        from sqlalchemy.engine import make_url
+
+        from query_timing import query_timing
+
+        @app.before_request
+        def start_request_span():
+            parent = _TRACEPARENT.match(request.headers.get('traceparent', ''))
+            if parent:
+                trace_id, parent_id, flags = parent.groups()
+                sampled = int(flags, 16) & 1
+            else:
+                trace_id, parent_id = f'{random.getrandbits(128):032x}', None
+                sampled = random.random() < self.sample_rate
+            if not sampled:
+                g.trace_token = _current.set(UNSAMPLED)
+                return
+            span = Span(f"{request.method} {request.endpoint or 'unmatched'}",
+                        trace_id,
+                        parent_id, SERVER, {
+                            'http.method': request.method,
+                            'http.target': request.path,
+                            'http.route': str(request.url_rule)
+                        })
+            g.trace_span = span
+            g.trace_token = _current.set(span)
+
+        @app.after_request
+        def record_status(response):
+            span = g.get('trace_span')
+            if span is not None:
+                span.set('http.status_code', response.status_code)
+            return response
+
+        @app.teardown_request
+        def end_request_span(exc):
+            span = g.pop('trace_span', None)
+            token = g.pop('trace_token', None)
+            if span is not None:
+                if exc is not None:
+                    span.fail(exc)
+                self.end(span)
+            if token is not None:
+                _current.reset(token)
+
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI')
+        if uri:
+            self.db_system = make_url(uri).get_backend_name()
+        query_timing.subscribe(self._record_query)
+
+    def current(self):
+        return _current.get()
+
+    def start_span(self, name, parent=None, kind=INTERNAL, **attributes):
+        """A child of ``parent`` (which is not made current); end with ``end``"""
+        if parent is None or not parent.sampled:
+            return UNSAMPLED
+        return Span(name, parent.trace_id, parent.span_id, kind, attributes)
+
+    def end(self, span):
+        if span.sampled:
+            span.end_ns = time.time_ns()
+            self.exporter.export(span)
+
+    @contextmanager
+    def span(self, name, parent=None, kind=INTERNAL, **attributes):
+        """Time the block as a child of ``parent`` or of the current span"""
+        if not self.enabled:
+            yield UNSAMPLED
+            return
+        span = self.start_span(name, parent or _current.get(), kind,
+                               **attributes)
+        if not span.sampled:
+            yield span
+            return
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            _current.reset(token)
+            self.end(span)
+
+    def _record_query(self, statement, parameters, executemany, started,
+                      elapsed):
+        parent = _current.get()
+        if parent is None or not parent.sampled:
+            return
+        attributes = {'db.statement': statement[:TRACE_STATEMENT_MAX]}
+        if self.db_system:
+            attributes['db.system'] = self.db_system
+        span = self.start_span('db.query', parent, CLIENT, **attributes)
+        span.start_ns = time.time_ns() - int(elapsed * 1e9)
+        self.end(span)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'exported': self.exporter.exported,
+            'dropped': self.exporter.dropped,
+            'failures': self.exporter.failures
+        }
+
+
+tracer = Tracer()
+
+
+def _collector_main(port, path):
+    """OTLP/HTTP stand-in that appends the spans it receives to ``path``"""
+    from werkzeug.serving import run_simple
+    from werkzeug.wrappers import Request, Response
+
+    @Request.application
+    def collect(request):
+        if request.method != 'POST' or request.path != '/v1/traces':
+            return Response('Not Found', 404)
+        payload = request.get_json(force=True)
+        with open(path, 'a') as f:
+            for resource in payload.get('resourceSpans', []):
+                for scope in resource.get('scopeSpans', []):
+                    for span in scope.get('spans', []):
+                        f.write(json.dumps(span) + '\n')
+        return Response('{}', content_type='application/json')
+
+    run_simple('127.0.0.1', port, collect, threaded=True)
+
+
+if __name__ == '__main__':
+    _collector_main(int(sys.argv[1]) if len(sys.argv) > 1 else 4318,
+                    sys.argv[2] if len(sys.argv) > 2 else 'otlp-spans.jsonl')